@@ -1,16 +1,26 @@
-from datetime import datetime, timedelta
-from typing import Optional
+import asyncio
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from cache import principal_cache
 from config import settings
-from database import get_db
+from database import get_async_db
 from models import User
+from revocation import revocation_list
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; hashes with a different cost report needs_update
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.PASSWORD_HASH_ROUNDS)
 
 # JWT token handling
 security = HTTPBearer()
@@ -23,6 +33,79 @@ def get_password_hash(password: str) -> str:
     """Hash a password."""
     return pwd_context.hash(password)
 
+class PasswordHasher:
+    """Runs password hashing on a bounded thread pool, off the event loop.
+
+    bcrypt releases the GIL while hashing, so the worker threads use every
+    core without the pickling cost of a process pool.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+
+    def _timed(self, function: Callable, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.completed += 1
+                self.busy_seconds += elapsed
+
+    async def run(self, function: Callable, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many concurrent sign-ins, please retry",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, function, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "rounds": settings.PASSWORD_HASH_ROUNDS,
+                "in_flight": self.pending,
+                "queue_depth": max(0, self.pending - self.workers),
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "average_ms": 1000 * self.busy_seconds / self.completed if self.completed else 0.0,
+                "hashes_per_second": self.completed / (time.monotonic() - self._started)
+            }
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the hashing pool."""
+    return await password_hasher.run(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the hashing pool.
+
+    Returns (verified, new_hash); new_hash is set when the stored hash uses
+    outdated cost parameters and should be replaced.
+    """
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -31,24 +114,43 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex, "type": "access"})
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify a JWT token and return the username."""
+def create_refresh_token(username: str) -> str:
+    """Create a long-lived JWT that can only be exchanged for new tokens."""
+    expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    to_encode = {"sub": username, "exp": expire, "jti": uuid.uuid4().hex, "type": "refresh"}
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+def decode_token(token: str, token_type: str = "access", db: Optional[Session] = None) -> Optional[dict]:
+    """Verify signature, expiry, token type and revocation; return the claims."""
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        return username
     except JWTError:
         return None
+    if payload.get("sub") is None or payload.get("type", "access") != token_type:
+        return None
+    # Tokens issued before revocation support carry no jti and simply expire
+    jti = payload.get("jti")
+    if jti and revocation_list.is_revoked(jti, db):
+        return None
+    return payload
+
+def revoke_token(db: Session, payload: dict) -> bool:
+    """Revoke a decoded token until it would have expired anyway."""
+    expires_at = datetime.fromtimestamp(payload["exp"], tz=timezone.utc)
+    return revocation_list.revoke(db, payload["jti"], expires_at, payload.get("sub"))
 
-def get_current_user(
+def verify_token(token: str, db: Optional[Session] = None) -> Optional[str]:
+    """Verify an access token and return the username."""
+    payload = decode_token(token, "access", db)
+    return payload["sub"] if payload else None
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get the current authenticated user."""
     credentials_exception = HTTPException(
@@ -57,18 +159,35 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    username = verify_token(credentials.credentials)
+    # The revocation check is shared with sync callers, so it runs on the sync facade
+    username = await db.run_sync(lambda session: verify_token(credentials.credentials, session))
     if username is None:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == username).first()
+    snapshot = principal_cache.get(username)
+    if snapshot is not None:
+        # Attach a copy to this session without a SELECT so routes can still modify it
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+    
+    user = (await db.execute(select(User).where(User.username == username))).scalar_one_or_none()
     if user is None:
         raise credentials_exception
     
+    principal_cache.set(username, {
+        attribute.key: getattr(user, attribute.key) for attribute in inspect(User).column_attrs
+    })
     return user
 
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get the current active user."""
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    """Get the current user if they may administer the catalog."""
+    if current_user.username not in settings.CATALOG_ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Catalog administrators only")
+    return current_user
@@ -0,0 +1,131 @@
+"""Compare throughput of sync-session and async-session handlers under parallel load.
+
+Run with: python benchmark_concurrency.py [--requests 200] [--concurrency 20] [--latency-ms 20]
+
+Both handlers run the popular-books query after a statement that makes the
+database wait --latency-ms, standing in for network round trips and slow
+plans. The sync handler is the former pattern, an async route calling a
+blocking Session, which stalls the event loop for the whole wait. Defaults
+to a scratch SQLite file with a sleep() function registered on each
+connection; pass --sync-url/--async-url to measure against PostgreSQL.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import create_engine, event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from models import Base, Book
+from serialization import books_response
+
+def _register_sleep(dbapi_connection, connection_record):
+    # Runs on the thread executing the statement, like a server-side wait
+    dbapi_connection.create_function("sleep", 1, lambda ms: time.sleep(ms / 1000))
+
+def wait_statement(dialect_name: str):
+    if dialect_name == "postgresql":
+        return text("SELECT pg_sleep(:ms / 1000.0)")
+    return text("SELECT sleep(:ms)")
+
+def popular_books(limit: int = 5):
+    return select(Book).where(Book.is_available == True).order_by(
+        Book.bookmark_count.desc(), Book.id
+    ).limit(limit)
+
+def make_app(sync_url: str, async_url: str, latency_ms: float, pool_size: int) -> FastAPI:
+    sync_engine = create_engine(sync_url, pool_size=pool_size)
+    async_engine = create_async_engine(async_url, pool_size=pool_size)
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _register_sleep)
+        event.listen(async_engine.sync_engine, "connect", _register_sleep)
+    wait = wait_statement(sync_engine.dialect.name)
+    SyncSession = sessionmaker(bind=sync_engine)
+    AsyncSessionMaker = async_sessionmaker(async_engine, expire_on_commit=False)
+
+    def get_sync_db():
+        with SyncSession() as db:
+            yield db
+
+    async def get_async_db():
+        async with AsyncSessionMaker() as db:
+            yield db
+
+    app = FastAPI()
+
+    @app.get("/sync/popular")
+    async def sync_popular(db: Session = Depends(get_sync_db)):
+        db.execute(wait, {"ms": latency_ms})
+        return books_response(db.execute(popular_books()).scalars().all())
+
+    @app.get("/async/popular")
+    async def async_popular(db: AsyncSession = Depends(get_async_db)):
+        await db.execute(wait, {"ms": latency_ms})
+        return books_response((await db.execute(popular_books())).scalars().all())
+
+    app.state.engines = (sync_engine, async_engine)
+    return app
+
+def seed(sync_url: str, books: int):
+    engine = create_engine(sync_url)
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        if db.scalar(select(Book.id).limit(1)) is None:
+            db.add_all(
+                Book(title=f"Book {index}", author="Jane Doe", category="Programming", bookmark_count=index % 50)
+                for index in range(books)
+            )
+            db.commit()
+    engine.dispose()
+
+async def measure(app: FastAPI, path: str, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def one():
+            async with semaphore:
+                response = await client.get(path)
+                response.raise_for_status()
+
+        await one()  # warm the pool
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - started
+
+async def main(args):
+    app = make_app(args.sync_url, args.async_url, args.latency_ms, args.concurrency)
+    try:
+        for label, path in (("sync session", "/sync/popular"), ("async session", "/async/popular")):
+            elapsed = await measure(app, path, args.requests, args.concurrency)
+            print(f"{label:14} {args.requests / elapsed:8.1f} req/s  {elapsed / args.requests * 1000:7.2f} ms/request")
+    finally:
+        sync_engine, async_engine = app.state.engines
+        sync_engine.dispose()
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=20, help="Database wait per request")
+    parser.add_argument("--books", type=int, default=1000)
+    parser.add_argument("--sync-url")
+    parser.add_argument("--async-url")
+    args = parser.parse_args()
+    if bool(args.sync_url) != bool(args.async_url):
+        parser.error("--sync-url and --async-url must be given together")
+
+    scratch = None
+    if not args.sync_url:
+        scratch = os.path.join(tempfile.mkdtemp(), "benchmark.db")
+        args.sync_url = f"sqlite:///{scratch}"
+        args.async_url = f"sqlite+aiosqlite:///{scratch}"
+    seed(args.sync_url, args.books)
+    try:
+        asyncio.run(main(args))
+    finally:
+        if scratch:
+            os.remove(scratch)
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from config import settings
+from models import Book, User
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after a fixed TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key, calling loader on a miss."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    async def get_or_set_async(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """get_or_set() for a coroutine loader."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = await loader()
+            self.set(key, value)
+        return value
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key satisfies predicate."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
+
+# Categories, tags and featured books; cleared whenever a Book row changes
+catalog_cache = TTLCache(
+    maxsize=settings.CATALOG_CACHE_MAX_ENTRIES,
+    ttl=settings.CATALOG_CACHE_TTL_SECONDS
+)
+
+# Column snapshots of authenticated users; entries are dropped when the user changes
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS
+)
+
+@event.listens_for(Session, "after_flush")
+def _track_book_writes(session, flush_context):
+    if any(isinstance(obj, Book) for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["catalog_changed"] = True
+
+@event.listens_for(Session, "after_flush")
+def _track_user_writes(session, flush_context):
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            # Includes the previous username if it was changed
+            usernames = session.info.setdefault("changed_usernames", set())
+            usernames.add(obj.username)
+            usernames.update(inspect(obj).attrs.username.history.deleted or ())
+
+def mark_catalog_changed(session):
+    """Clear the catalog cache when session commits, for Book writes made through Core statements."""
+    session.info["catalog_changed"] = True
+
+def mark_featured_changed(session):
+    """Drop only the cached featured lists when session commits, e.g. after a bookmark count update."""
+    session.info["featured_changed"] = True
+
+def _is_featured_key(key) -> bool:
+    return isinstance(key, tuple) and key[0] == "featured"
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_catalog_cache(session):
+    featured_changed = session.info.pop("featured_changed", False)
+    if session.info.pop("catalog_changed", False):
+        catalog_cache.clear()
+    elif featured_changed:
+        catalog_cache.delete_where(_is_featured_key)
+    for username in session.info.pop("changed_usernames", ()):
+        principal_cache.delete(username)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_changes(session):
+    session.info.pop("catalog_changed", None)
+    session.info.pop("featured_changed", None)
+    session.info.pop("changed_usernames", None)
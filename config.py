@@ -14,10 +14,58 @@ class Settings(BaseSettings):
     def DATABASE_URL(self) -> str:
         return f"postgresql://{self.postgres_user}:{self.postgres_password}@{self.postgres_host}:{self.postgres_port}/{self.postgres_db}"
     
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        return self.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+    
+    # Connection pool, per engine and worker process; the sync and async engines
+    # each hold up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: int = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # -1 never recycles
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 30000  # 0 disables
+    
+    # Read replicas for catalog reads (sync URLs, e.g. postgresql://...); empty reads from the primary
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_HEALTH_CHECK_SECONDS: int = 10
+    REPLICA_HEALTH_CHECK_TIMEOUT_SECONDS: int = 2
+    
+    # Per-request SQL instrumentation (X-DB-* response headers, probable N+1 warnings);
+    # the headers reveal query timings to any client, so enable it in development only
+    SQL_STATS_ENABLED: bool = False
+    SQL_REPEATED_STATEMENT_THRESHOLD: int = 5
+    
+    # Prometheus metrics at /metrics (histogram buckets in seconds and bytes)
+    METRICS_ENABLED: bool = True
+    METRICS_LATENCY_BUCKETS: List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+    METRICS_SIZE_BUCKETS: List[float] = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+    METRICS_TASK_BUCKETS: List[float] = [0.1, 0.5, 1, 5, 15, 60, 300, 900]
+    
     # JWT
     SECRET_KEY: str = "your-secret-key-change-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+    
+    # Token revocation (Bloom filter over revoked_tokens, re-synced periodically)
+    REVOCATION_BLOOM_CAPACITY: int = 100000
+    REVOCATION_BLOOM_ERROR_RATE: float = 0.001
+    REVOCATION_SYNC_SECONDS: int = 5
+    REVOCATION_SYNC_ID_OVERLAP: int = 1000  # Ids re-read below the newest seen on each sync
+    
+    # Password hashing (bcrypt cost factor; existing hashes are upgraded on login)
+    PASSWORD_HASH_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 0  # 0 uses one thread per CPU
+    PASSWORD_HASH_MAX_PENDING: int = 256
+    
+    # Login throttling (sliding window); set the Redis URL to share it across workers
+    LOGIN_THROTTLE_WINDOW_SECONDS: int = 300
+    LOGIN_THROTTLE_MAX_PER_USERNAME: int = 10
+    LOGIN_THROTTLE_MAX_PER_IP: int = 100
+    LOGIN_THROTTLE_MAX_KEYS: int = 100000
+    LOGIN_THROTTLE_REDIS_URL: str = ""
     
     # CORS
     ALLOWED_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:8080"]
@@ -27,6 +75,32 @@ class Settings(BaseSettings):
     SMTP_PORT: int = 587
     SMTP_USERNAME: str = ""
     SMTP_PASSWORD: str = ""
+    
+    # Catalog administration (bulk ingestion over HTTP); empty leaves ingest.py CLI-only
+    CATALOG_ADMIN_USERNAMES: List[str] = []
+    
+    # Catalog cache (categories, tags, featured)
+    CATALOG_CACHE_TTL_SECONDS: int = 300
+    CATALOG_CACHE_MAX_ENTRIES: int = 256
+    
+    # Authenticated-principal cache, keyed by token subject
+    PRINCIPAL_CACHE_TTL_SECONDS: int = 60
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    
+    # HTTP caching (Cache-Control max-age for conditional GET endpoints)
+    HTTP_CACHE_MAX_AGE_SECONDS: int = 60
+    STATIC_CACHE_MAX_AGE_SECONDS: int = 3600
+    
+    # Local storage root for Book.book_file_url paths
+    BOOK_FILES_DIR: str = "book_files"
+    
+    # Move objects alive once the suggest index is built out of the collector's reach;
+    # this also pins whatever else exists at that point, so it is opt-in
+    GC_FREEZE_AFTER_STARTUP: bool = False
+    
+    # Content-based similar books (TF-IDF neighbours)
+    SIMILAR_BOOKS_TOP_K: int = 20
+    SIMILAR_BOOKS_LOAD_ON_STARTUP: bool = True
 
     
     class Config:
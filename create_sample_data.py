@@ -1,15 +1,17 @@
 import asyncio
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import Base, User, Book, Survey
+from database import SessionLocal
+from models import User, Book, Survey
 from auth_utils import get_password_hash
 import json
+from alembic import command
+from schema_version import alembic_config
 
 def create_sample_data():
     """Create sample data for testing the API."""
     
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
+    # Create or upgrade the schema
+    command.upgrade(alembic_config(), "head")
     
     db = SessionLocal()
     
@@ -1,11 +1,27 @@
 from sqlalchemy import create_engine
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from config import settings
+from pooling import engine_options
+from replicas import ReplicaRouter
 
-engine = create_engine(settings.DATABASE_URL)
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the route handlers (asyncpg); objects stay usable after commit
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL, **engine_options(settings.ASYNC_DATABASE_URL, asynchronous=True)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+replica_router = ReplicaRouter(
+    settings.DATABASE_REPLICA_URLS,
+    check_interval=settings.REPLICA_HEALTH_CHECK_SECONDS,
+    check_timeout=settings.REPLICA_HEALTH_CHECK_TIMEOUT_SECONDS
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -14,3 +30,22 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_read_db():
+    """Session on a healthy read replica, or on the primary if there is none.
+
+    Only for read-only handlers that tolerate replication lag; anything that
+    writes or must see the caller's own writes uses get_async_db.
+    """
+    replica = replica_router.choose()
+    async with (replica.sessionmaker if replica else AsyncSessionLocal)() as db:
+        try:
+            yield db
+        except DBAPIError as exc:
+            if replica and exc.connection_invalidated:
+                replica.mark_failed(exc)
+            raise
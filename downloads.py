@@ -0,0 +1,38 @@
+import hashlib
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from urllib.parse import unquote, urlparse
+from config import settings
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def resolve_book_file(book_file_url: Optional[str]) -> Optional[Path]:
+    """Map Book.book_file_url to a file under BOOK_FILES_DIR, if stored locally.
+
+    Remote URLs and paths escaping the storage directory resolve to None.
+    """
+    if not book_file_url:
+        return None
+    parsed = urlparse(book_file_url)
+    if parsed.scheme not in ("", "file"):
+        return None
+
+    root = Path(settings.BOOK_FILES_DIR).resolve()
+    path = (root / unquote(parsed.path).lstrip("/")).resolve()
+    if not path.is_relative_to(root) or not path.is_file():
+        return None
+    return path
+
+@lru_cache(maxsize=4096)
+def _content_digest(path: str, mtime_ns: int, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_etag(path: Path, stat_result: os.stat_result) -> str:
+    """Strong ETag from the file's SHA-256, hashed once per (mtime, size)."""
+    return f'"{_content_digest(str(path), stat_result.st_mtime_ns, stat_result.st_size)[:32]}"'
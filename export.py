@@ -0,0 +1,77 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Iterator, Optional
+from sqlalchemy.orm import Session
+from models import Book
+from tagging import normalize_tags
+
+EXPORT_COLUMNS = [
+    Book.id, Book.title, Book.author, Book.description, Book.isbn, Book.category,
+    Book.tags, Book.language, Book.page_count, Book.file_size, Book.published_date,
+    Book.is_available, Book.bookmark_count, Book.created_at
+]
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+# Rows fetched per server-side cursor batch and written per output chunk
+EXPORT_BATCH_SIZE = 1000
+
+def _export_rows(
+    session: Session,
+    category: Optional[str],
+    is_available: Optional[bool]
+) -> Iterator[tuple]:
+    query = session.query(*EXPORT_COLUMNS)
+    if category:
+        query = query.filter(Book.category == category)
+    if is_available is not None:
+        query = query.filter(Book.is_available == is_available)
+    # yield_per streams through a server-side cursor instead of buffering the table
+    return query.order_by(Book.id).yield_per(EXPORT_BATCH_SIZE)
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def stream_ndjson(session: Session, category: Optional[str], is_available: Optional[bool]) -> Iterator[str]:
+    """Yield the catalog as newline-delimited JSON, one book per line."""
+    chunk = []
+    for row in _export_rows(session, category, is_available):
+        record = dict(zip(EXPORT_FIELDS, row))
+        record["tags"] = normalize_tags(record["tags"])
+        chunk.append(json.dumps(record, default=_json_default, ensure_ascii=False))
+        if len(chunk) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+def stream_csv(session: Session, category: Optional[str], is_available: Optional[bool]) -> Iterator[str]:
+    """Yield the catalog as CSV with a header row; tags are '|'-separated."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    tags_index = EXPORT_FIELDS.index("tags")
+    for count, row in enumerate(_export_rows(session, category, is_available), start=1):
+        row = list(row)
+        row[tags_index] = "|".join(normalize_tags(row[tags_index]))
+        writer.writerow(row)
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def stream_export(bind, export_format: str, category: Optional[str], is_available: Optional[bool]) -> Iterator[str]:
+    """Stream an export on its own session so it outlives the request's session."""
+    session = Session(bind=bind)
+    try:
+        if export_format == "csv":
+            yield from stream_csv(session, category, is_available)
+        else:
+            yield from stream_ndjson(session, category, is_available)
+    finally:
+        session.close()
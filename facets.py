@@ -0,0 +1,54 @@
+from typing import Dict, List
+from sqlalchemy import func, literal, select, union_all
+from sqlalchemy.orm import Session
+from models import Book, Tag, book_tags
+
+FACETS = ("category", "language", "tag")
+
+def facet_counts(db: Session, query, limit_per_facet: int = 10) -> Dict[str, List[dict]]:
+    """Count category, language and tag values over a filtered Book query.
+
+    The filtered rows are computed once as a CTE and all three facets are
+    grouped and capped in a single statement.
+    """
+    filtered = query.with_entities(
+        Book.id.label("id"),
+        Book.category.label("category"),
+        Book.language.label("language")
+    ).cte("filtered_books")
+
+    by_category = select(
+        literal("category").label("facet"),
+        filtered.c.category.label("value"),
+        func.count().label("count")
+    ).group_by(filtered.c.category)
+    by_language = select(
+        literal("language"), filtered.c.language, func.count()
+    ).group_by(filtered.c.language)
+    by_tag = select(
+        literal("tag"), Tag.name, func.count()
+    ).select_from(
+        filtered.join(book_tags, book_tags.c.book_id == filtered.c.id).join(Tag, Tag.id == book_tags.c.tag_id)
+    ).group_by(Tag.name)
+
+    counts = union_all(by_category, by_language, by_tag).subquery()
+    ranked = select(
+        counts.c.facet,
+        counts.c.value,
+        counts.c.count,
+        func.row_number().over(
+            partition_by=counts.c.facet,
+            order_by=(counts.c.count.desc(), counts.c.value)
+        ).label("position")
+    ).subquery()
+
+    rows = db.execute(
+        select(ranked.c.facet, ranked.c.value, ranked.c.count)
+        .where(ranked.c.position <= limit_per_facet)
+        .order_by(ranked.c.facet, ranked.c.position)
+    ).all()
+
+    facets = {facet: [] for facet in FACETS}
+    for facet, value, count in rows:
+        facets[facet].append({"value": value, "count": count})
+    return facets
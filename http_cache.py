@@ -0,0 +1,77 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Optional
+from fastapi import Request, Response
+from config import settings
+from serialization import dump_json
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from version identifiers (ids, row version counters)."""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function
+    candidates = [candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")]
+    return etag in candidates
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since.
+
+    When both are sent only the ETag is compared (RFC 9110, 13.2.2). HTTP
+    dates have one-second resolution, so If-Modified-Since alone can answer
+    304 for an edit made within the same second as the cached copy.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = _as_utc(parsedate_to_datetime(if_modified_since))
+        except (TypeError, ValueError):
+            return False
+        return _as_utc(last_modified).replace(microsecond=0) <= since
+    return False
+
+def cache_headers(
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    max_age: Optional[int] = None
+) -> Dict[str, str]:
+    if max_age is None:
+        max_age = settings.HTTP_CACHE_MAX_AGE_SECONDS
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    return headers
+
+def not_modified_response(
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    max_age: Optional[int] = None
+) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, last_modified, max_age))
+
+def conditional_json_response(
+    request: Request,
+    content: Any,
+    max_age: Optional[int] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Return content as JSON with a content-hash ETag, or 304 if unchanged."""
+    body = dump_json(content)
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    response_headers = {**(headers or {}), **cache_headers(etag, max_age=max_age)}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=response_headers)
+    return Response(body, media_type="application/json", headers=response_headers)
@@ -0,0 +1,199 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+from cache import catalog_cache
+from isbn import normalize_isbn
+from models import Book
+from schemas import BookCreate, IngestReport
+from similarity import similarity_index, similarity_updates
+from suggest import suggest_index
+from tagging import normalize_tags, sync_many_book_tags
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Columns refreshed when an incoming row matches an existing ISBN
+UPSERT_COLUMNS = [
+    "title", "author", "description", "category", "tags", "cover_image_url",
+    "book_file_url", "file_size", "page_count", "language", "published_date"
+]
+
+def read_records(stream: IO[str], input_format: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (line number, record, parse error) from CSV or JSONL text."""
+    if input_format == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # Empty cells fall back to the BookCreate defaults
+            record = {key: value for key, value in record.items() if key and value not in ("", None)}
+            if record.get("tags") and record["tags"][:1] != "[":
+                record["tags"] = record["tags"].split("|")
+            yield reader.line_num, record, None
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, "Expected a JSON object"
+            continue
+        yield line_number, record, None
+
+def _validate(record: dict) -> dict:
+    book = BookCreate.model_validate(record)
+    row = book.model_dump()
+    if book.isbn is not None:
+        row["isbn"] = normalize_isbn(book.isbn)
+        if row["isbn"] is None:
+            raise ValueError(f"Invalid ISBN: {book.isbn}")
+    row["tags"] = json.dumps(normalize_tags(book.tags))
+    return row
+
+def _upsert_statement(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Bulk ingestion is not supported on {dialect_name}")
+
+    statement = insert(Book)
+    updates = {column: statement.excluded[column] for column in UPSERT_COLUMNS}
+    updates["updated_at"] = func.now()
+    updates["version"] = Book.version + 1
+    return statement.on_conflict_do_update(index_elements=[Book.isbn], set_=updates)
+
+def _write_rows(engine: Engine, upsert, with_isbn: List[dict], without_isbn: List[dict]) -> List[tuple]:
+    """Write rows in one transaction; return (book_id, is_available, row) for each."""
+    with engine.begin() as connection:
+        written = []
+        if with_isbn:
+            # No RETURNING here: it would force row-at-a-time execution
+            connection.execute(upsert, with_isbn)
+            rows_by_isbn = {row["isbn"]: row for row in with_isbn}
+            written.extend(
+                (book_id, is_available, rows_by_isbn[isbn])
+                for book_id, isbn, is_available in connection.execute(
+                    select(Book.id, Book.isbn, Book.is_available).where(Book.isbn.in_(list(rows_by_isbn)))
+                )
+            )
+        if without_isbn:
+            inserted = connection.execute(
+                insert(Book).returning(Book.id, Book.is_available, sort_by_parameter_order=True),
+                without_isbn
+            ).all()
+            written.extend(
+                (book_id, is_available, row) for (book_id, is_available), row in zip(inserted, without_isbn)
+            )
+        sync_many_book_tags(
+            connection, {book_id: json.loads(row["tags"]) for book_id, _, row in written}
+        )
+    return written
+
+def _write_chunk(engine: Engine, upsert, chunk: List[Tuple[int, dict]], report: IngestReport):
+    # One row per ISBN per chunk: ON CONFLICT cannot touch a row twice. The last
+    # occurrence wins, as it would across chunks; earlier ones are reported.
+    deduplicated = {}
+    for position, (line, row) in enumerate(chunk):
+        key = row["isbn"] or ("line", position)
+        if key in deduplicated:
+            report.add_error(deduplicated[key][0], f"Duplicate ISBN {row['isbn']}, superseded by line {line}")
+        deduplicated[key] = (line, row)
+    with_isbn = [row for _, row in deduplicated.values() if row["isbn"]]
+    without_isbn = [row for _, row in deduplicated.values() if not row["isbn"]]
+
+    try:
+        written = _write_rows(engine, upsert, with_isbn, without_isbn)
+    except Exception:
+        # Retry row by row so one bad row does not discard the rest of the chunk
+        written = []
+        for line, row in deduplicated.values():
+            with_isbn, without_isbn = ([row], []) if row["isbn"] else ([], [row])
+            try:
+                written.extend(_write_rows(engine, upsert, with_isbn, without_isbn))
+            except Exception as exc:
+                report.add_error(line, f"{exc.__class__.__name__}: {exc}")
+
+    report.rows_written += len(written)
+    suggest_index.apply({
+        book_id: None if is_available is False else (row["title"], row["author"])
+        for book_id, is_available, row in written
+    })
+    documents = [
+        (book_id, row["title"], row["description"], row["category"], row["tags"])
+        for book_id, is_available, row in written if is_available is not False
+    ]
+    if documents and similarity_index.built:
+        # Vectorized on the updater thread, as for ORM commits; only books new to
+        # the index gain neighbours, updates wait for a rebuild
+        similarity_updates.submit(documents)
+
+def ingest_books(
+    engine: Engine,
+    records: Iterable[Tuple[int, Optional[dict], Optional[str]]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> IngestReport:
+    """Validate records and upsert them on ISBN, one chunk per transaction.
+
+    Only one chunk is held in memory at a time; a chunk that fails is
+    retried row by row. Rows without an ISBN are always inserted as new
+    books.
+    """
+    report = IngestReport()
+    upsert = _upsert_statement(engine.dialect.name)
+    started = time.perf_counter()
+    chunk = []
+
+    for line, record, parse_error in records:
+        report.rows_read += 1
+        if parse_error:
+            report.add_error(line, parse_error)
+            continue
+        try:
+            chunk.append((line, _validate(record)))
+        except ValidationError as exc:
+            report.add_error(line, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+            ))
+        except ValueError as exc:
+            report.add_error(line, str(exc))
+
+        if len(chunk) >= chunk_size:
+            _write_chunk(engine, upsert, chunk, report)
+            chunk = []
+
+    if chunk:
+        _write_chunk(engine, upsert, chunk, report)
+
+    catalog_cache.clear()
+    report.elapsed_seconds = round(time.perf_counter() - started, 3)
+    if report.elapsed_seconds:
+        report.rows_per_second = round(report.rows_written / report.elapsed_seconds, 1)
+    return report
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Bulk load books from a CSV or JSONL file.")
+    parser.add_argument("path", help="Input file, or - for stdin")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    input_format = args.format or ("csv" if args.path.endswith(".csv") else "jsonl")
+    stream = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+    try:
+        report = ingest_books(engine, read_records(stream, input_format), args.chunk_size)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print(report.model_dump_json(indent=2))
@@ -0,0 +1,30 @@
+import re
+from typing import Optional
+
+_separators = re.compile(r"[\s-]")
+
+def _isbn13_check_digit(first12: str) -> str:
+    total = sum(int(digit) * (1 if i % 2 == 0 else 3) for i, digit in enumerate(first12))
+    return str((10 - total % 10) % 10)
+
+def normalize_isbn(value: str) -> Optional[str]:
+    """Normalize an ISBN-10 or ISBN-13 to the 13-digit form stored in Book.isbn.
+
+    ISBN-10 check digits are verified because they are recomputed for the
+    13-digit form; 13-digit values are passed through so rows stored with a
+    bad check digit stay reachable. Returns None for anything else.
+    """
+    isbn = _separators.sub("", value or "").upper()
+
+    if len(isbn) == 10 and isbn[:9].isdigit() and (isbn[9].isdigit() or isbn[9] == "X"):
+        total = sum((10 - i) * int(digit) for i, digit in enumerate(isbn[:9]))
+        total += 10 if isbn[9] == "X" else int(isbn[9])
+        if total % 11 != 0:
+            return None
+        first12 = "978" + isbn[:9]
+        return first12 + _isbn13_check_digit(first12)
+
+    if len(isbn) == 13 and isbn.isdigit():
+        return isbn
+
+    return None
@@ -1,21 +1,58 @@
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
+import asyncio
+import contextlib
+import gc
+import logging
+import threading
 import uvicorn
 
-from database import engine, Base
+from database import engine, async_engine, replica_router
 from routers import auth, users, library, bookmarks, interactions, notifications
 from config import settings
+from similarity import load_similarity_index
+from suggest import load_suggest_index
+from pooling import pool_metrics
+from schema_version import check_schema_version
+from query_stats import QueryStatsMiddleware, QUERY_COUNT_HEADER, QUERY_TIME_HEADER, REPEATED_HEADER
+from metrics import MetricsMiddleware, registry
+
+logger = logging.getLogger(__name__)
+
+def _log_task_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Startup task %s failed", task.get_name(), exc_info=task.exception())
+
+async def _warm_suggest_index():
+    await load_suggest_index()
+    if settings.GC_FREEZE_AFTER_STARTUP:
+        # Keep full collections from rescanning the long-lived indexes (p99 spikes)
+        gc.collect()
+        gc.freeze()
 
-# Create database tables
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    Base.metadata.create_all(bind=engine)
+    # Startup; the schema itself is managed by `alembic upgrade head`
+    check_schema_version(engine)
+    if settings.SIMILAR_BOOKS_LOAD_ON_STARTUP:
+        # Vectorizing the catalog takes a while; new books are indexed once it is ready
+        threading.Thread(target=load_similarity_index, args=(engine,), daemon=True).start()
+    # Typeahead requests arriving before this finishes wait for the same build
+    suggest_load = asyncio.create_task(_warm_suggest_index())
+    suggest_load.add_done_callback(_log_task_failure)
+    health_checks = asyncio.create_task(replica_router.run_health_checks()) if replica_router.replicas else None
     yield
     # Shutdown
-    pass
+    suggest_load.cancel()
+    if health_checks:
+        health_checks.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await health_checks
+    await replica_router.dispose()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="EaseOps API",
@@ -30,8 +67,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", QUERY_COUNT_HEADER, QUERY_TIME_HEADER, REPEATED_HEADER],
 )
 
+if settings.SQL_STATS_ENABLED:
+    app.add_middleware(QueryStatsMiddleware)
+
+# Outermost, so the latency includes the other middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
@@ -46,7 +91,17 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "EaseOps E-Library User Backend"}
+    return {
+        "status": "healthy",
+        "service": "EaseOps E-Library User Backend",
+        "database_pool": {"sync": pool_metrics(engine), "async": pool_metrics(async_engine.sync_engine)},
+        "read_replicas": replica_router.stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of this worker's request and background-task metrics."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
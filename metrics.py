@@ -0,0 +1,243 @@
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence
+from config import settings
+
+class _Metric:
+    """Base for metrics whose samples live in per-thread shards.
+
+    Each thread only ever writes its own shard, so recording takes no lock;
+    render() sums the shards. Values are per worker process, like any
+    in-process registry: scrape each worker or aggregate in Prometheus.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._lock = threading.Lock()  # Only taken when a thread creates its shard
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _merged(self) -> Dict[tuple, object]:
+        raise NotImplementedError
+
+    def _labels(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in sorted(self._merged().items()):
+            lines.extend(self._samples(labels, value))
+        return lines
+
+    def _samples(self, labels: tuple, value) -> List[str]:
+        return [f"{self.name}{self._labels(labels)} {_number(value)}"]
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merged(self):
+        totals = {}
+        for shard in list(self._shards):
+            for labels, value in list(shard.items()):
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+class Gauge(Counter):
+    """A value that goes up and down, e.g. requests in progress."""
+
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Per-bucket (not cumulative) counts with +Inf last, then the sum
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _merged(self):
+        totals = {}
+        for shard in list(self._shards):
+            for labels, state in list(shard.items()):
+                merged = totals.setdefault(labels, [0] * len(state))
+                for index, value in enumerate(state):
+                    merged[index] += value
+        return totals
+
+    def _samples(self, labels: tuple, state) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip((*self.buckets, float("inf")), state):
+            cumulative += count
+            bucket = self._labels(labels, 'le="' + _number(bound) + '"')
+            lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+        lines.append(f"{self.name}_sum{self._labels(labels)} {_number(state[-1])}")
+        lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template, method and status class",
+    ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to the end of the response body",
+    ("method", "route", "status"), settings.METRICS_LATENCY_BUCKETS
+))
+http_response_size = registry.register(Histogram(
+    "http_response_size_bytes", "Response body size",
+    ("method", "route"), settings.METRICS_SIZE_BUCKETS
+))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "Requests currently being served",
+    ("method",)
+))
+background_task_duration = registry.register(Histogram(
+    "background_task_duration_seconds", "Background task run time by outcome",
+    ("task", "outcome"), settings.METRICS_TASK_BUCKETS
+))
+
+# Raw paths never become labels; unmatched requests (404 scans) share one series
+UNMATCHED_ROUTE = "unmatched"
+
+def route_template(scope) -> str:
+    """The template of the route that served scope, e.g. /api/library/books/{book_id}.
+
+    Routing stores the matched route in the scope, but an included router's
+    route only knows its own path, so the include prefix is taken from the
+    leading segments of the request path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path", None)
+    if template is None:
+        return UNMATCHED_ROUTE
+    segments = scope["path"].split("/")
+    prefix = "/".join(segments[:len(segments) - template.count("/")])
+    return prefix + template
+
+class MetricsMiddleware:
+    """Records count, latency, size and concurrency per route template and status class.
+
+    The route is only known once routing has run, so the in-progress gauge
+    is labelled by method alone.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "5xx"
+        size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = f"{message['status'] // 100}xx"
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        started = time.perf_counter()
+        http_requests_in_progress.inc(method)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            http_requests_in_progress.dec(method)
+            route = route_template(scope)
+            http_request_duration.observe(time.perf_counter() - started, method, route, status)
+            http_requests.inc(method, route, status)
+            http_response_size.observe(size, method, route)
+
+def timed_task(name: Optional[str] = None) -> Callable:
+    """Decorator recording run time and outcome of a background task (sync or async)."""
+    def decorate(function):
+        task = name or function.__name__
+
+        def record(started: float, outcome: str):
+            background_task_duration.observe(time.perf_counter() - started, task, outcome)
+
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = await function(*args, **kwargs)
+                except BaseException:
+                    record(started, "error")
+                    raise
+                record(started, "success")
+                return result
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = function(*args, **kwargs)
+                except BaseException:
+                    record(started, "error")
+                    raise
+                record(started, "success")
+                return result
+        return wrapper
+    return decorate
@@ -0,0 +1,95 @@
+"""normalized book tags
+
+Adds tags and book_tags and fills them from the JSON books.tags column,
+which stays the source of truth.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 02:35:04.530917
+
+"""
+import json
+from typing import List, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tags',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tags_id'), 'tags', ['id'], unique=False)
+    op.create_index(op.f('ix_tags_name'), 'tags', ['name'], unique=True)
+    op.create_table('book_tags',
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('tag_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['tag_id'], ['tags.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('book_id', 'tag_id')
+    )
+    op.create_index('ix_book_tags_tag_id_book_id', 'book_tags', ['tag_id', 'book_id'], unique=False)
+    _backfill_book_tags()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_book_tags_tag_id_book_id', table_name='book_tags')
+    op.drop_table('book_tags')
+    op.drop_index(op.f('ix_tags_name'), table_name='tags')
+    op.drop_index(op.f('ix_tags_id'), table_name='tags')
+    op.drop_table('tags')
+
+
+def _tag_names(value) -> List[str]:
+    # Frozen copy of tagging.normalize_tags as of this revision
+    if not value:
+        return []
+    try:
+        value = json.loads(value)
+    except ValueError:
+        value = value.split(",")
+    if isinstance(value, str):
+        value = [value]
+    names = []
+    for tag in value:
+        name = str(tag).strip().lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _backfill_book_tags(batch_size: int = 1000) -> None:
+    connection = op.get_bind()
+    books = sa.table('books', sa.column('id', sa.Integer), sa.column('tags', sa.Text))
+    tags = sa.table('tags', sa.column('id', sa.Integer), sa.column('name', sa.String))
+    book_tags = sa.table('book_tags', sa.column('book_id', sa.Integer), sa.column('tag_id', sa.Integer))
+    tag_ids = {}
+    last_id = 0
+    while True:
+        batch = connection.execute(
+            sa.select(books.c.id, books.c.tags)
+            .where(books.c.id > last_id, books.c.tags.isnot(None))
+            .order_by(books.c.id).limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+        names_by_book = {book_id: _tag_names(value) for book_id, value in batch}
+        missing = {name for names in names_by_book.values() for name in names} - tag_ids.keys()
+        if missing:
+            connection.execute(tags.insert(), [{'name': name} for name in sorted(missing)])
+            tag_ids.update(connection.execute(sa.select(tags.c.name, tags.c.id).where(tags.c.name.in_(missing))).all())
+        rows = [{'book_id': book_id, 'tag_id': tag_ids[name]} for book_id, names in names_by_book.items() for name in names]
+        if rows:
+            connection.execute(book_tags.insert(), rows)
@@ -0,0 +1,38 @@
+"""book bookmark count
+
+Adds the bookmark counter maintained by popularity.py, fills it from
+user_bookmarks and indexes it for /popular.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 02:35:06.702455
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('books', sa.Column('bookmark_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE books SET bookmark_count = (
+            SELECT count(*) FROM user_bookmarks WHERE user_bookmarks.book_id = books.id
+        )
+    """)
+    op.create_index('ix_books_popularity', 'books', ['is_available', sa.literal_column('bookmark_count DESC'), 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_books_popularity', table_name='books')
+    op.drop_column('books', 'bookmark_count')
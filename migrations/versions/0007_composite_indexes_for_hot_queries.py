@@ -0,0 +1,58 @@
+"""composite indexes for hot queries
+
+Indexes are built with CREATE INDEX CONCURRENTLY on PostgreSQL, outside a
+transaction, so the tables stay writable during the build. A build that
+failed part-way leaves an INVALID index behind; each index is dropped
+first so re-running the upgrade rebuilds it.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 02:35:10.174276
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (name, table, columns, unique)
+INDEXES = [
+    ('ix_books_available_created_at', 'books', ['is_available', 'created_at', 'id'], False),
+    ('ix_feedback_user_id_id', 'feedback', ['user_id', 'id'], False),
+    ('ix_notifications_user_id_id', 'notifications', ['user_id', 'id'], False),
+    ('ix_survey_responses_survey_id_user_id', 'survey_responses', ['survey_id', 'user_id'], True),
+    ('ix_user_bookmarks_book_id', 'user_bookmarks', ['book_id'], False),
+    ('ix_user_notes_user_id_id', 'user_notes', ['user_id', 'id'], False),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the earliest response per (survey, user) so the unique index can be built
+    op.execute("""
+        DELETE FROM survey_responses
+        WHERE user_id IS NOT NULL AND id NOT IN (
+            SELECT min(id) FROM survey_responses
+            WHERE user_id IS NOT NULL
+            GROUP BY survey_id, user_id
+        )
+    """)
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
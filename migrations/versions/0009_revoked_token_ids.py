@@ -0,0 +1,73 @@
+"""revoked token ids
+
+Gives revoked_tokens a serial id for other workers to sync on, in place
+of revoked_at: PostgreSQL's now() is the transaction start time, so
+revoked_at does not follow commit order. jti stays unique.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 11:04:52.318846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _copy_table(columns, constraints, insert_columns):
+    # SQLite cannot change a primary key in place; rebuild the table and copy the rows over
+    op.drop_index(op.f('ix_revoked_tokens_expires_at'), table_name='revoked_tokens')
+    op.rename_table('revoked_tokens', '_revoked_tokens_old')
+    op.create_table('revoked_tokens', *columns, *constraints)
+    op.create_index(op.f('ix_revoked_tokens_expires_at'), 'revoked_tokens', ['expires_at'], unique=False)
+    op.execute(
+        f"INSERT INTO revoked_tokens ({insert_columns}) "
+        f"SELECT {insert_columns} FROM _revoked_tokens_old ORDER BY revoked_at"
+    )
+    op.drop_table('_revoked_tokens_old')
+
+
+def _columns():
+    return [
+        sa.Column('jti', sa.String(), nullable=False),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('revoked_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index(op.f('ix_revoked_tokens_revoked_at'), table_name='revoked_tokens')
+    if op.get_bind().dialect.name == 'postgresql':
+        # SERIAL numbers existing rows as it fills the column
+        op.execute('ALTER TABLE revoked_tokens ADD COLUMN id SERIAL NOT NULL')
+        op.drop_constraint('revoked_tokens_pkey', 'revoked_tokens', type_='primary')
+        op.create_primary_key('revoked_tokens_pkey', 'revoked_tokens', ['id'])
+        op.create_unique_constraint('revoked_tokens_jti_key', 'revoked_tokens', ['jti'])
+    else:
+        _copy_table(
+            [sa.Column('id', sa.Integer(), nullable=False), *_columns()],
+            [sa.PrimaryKeyConstraint('id'), sa.UniqueConstraint('jti')],
+            'jti, username, expires_at, revoked_at'
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_constraint('revoked_tokens_jti_key', 'revoked_tokens', type_='unique')
+        op.drop_constraint('revoked_tokens_pkey', 'revoked_tokens', type_='primary')
+        op.drop_column('revoked_tokens', 'id')
+        op.create_primary_key('revoked_tokens_pkey', 'revoked_tokens', ['jti'])
+    else:
+        _copy_table(_columns(), [sa.PrimaryKeyConstraint('jti')], 'jti, username, expires_at, revoked_at')
+    op.create_index(op.f('ix_revoked_tokens_revoked_at'), 'revoked_tokens', ['revoked_at'], unique=False)
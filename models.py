@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, Text, ForeignKey, Table, Index, DDL, event, inspect
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -8,7 +8,19 @@ user_bookmarks = Table(
     'user_bookmarks',
     Base.metadata,
     Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
-    Column('book_id', Integer, ForeignKey('books.id'), primary_key=True)
+    Column('book_id', Integer, ForeignKey('books.id'), primary_key=True),
+    # The primary key leads with user_id; this serves per-book lookups and FK checks
+    Index('ix_user_bookmarks_book_id', 'book_id')
+)
+
+# Association table for normalized book tags
+book_tags = Table(
+    'book_tags',
+    Base.metadata,
+    Column('book_id', Integer, ForeignKey('books.id', ondelete='CASCADE'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # Inverted index: tag -> books
+    Index('ix_book_tags_tag_id_book_id', 'tag_id', 'book_id')
 )
 
 class User(Base):
@@ -57,7 +69,7 @@ class Book(Base):
     description = Column(Text, nullable=True)
     isbn = Column(String, unique=True, nullable=True)
     category = Column(String, nullable=False, index=True)
-    tags = Column(Text, nullable=True)  # JSON string for tags
+    tags = Column(Text, nullable=True)  # JSON string for tags, mirrored into book_tags
     cover_image_url = Column(String, nullable=True)
     book_file_url = Column(String, nullable=True)
     file_size = Column(Integer, nullable=True)
@@ -65,12 +77,101 @@ class Book(Base):
     language = Column(String, default="English")
     published_date = Column(DateTime, nullable=True)
     is_available = Column(Boolean, default=True)
+    bookmark_count = Column(Integer, nullable=False, default=0, server_default="0")  # Maintained by popularity.py
+    # Bumped by every write, including Core UPDATEs; the book ETag is built from it
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    __table_args__ = (
+        # Serves /popular as a top-N index read
+        Index('ix_books_popularity', 'is_available', bookmark_count.desc(), 'id'),
+        # Serves /featured (newest available books)
+        Index('ix_books_available_created_at', 'is_available', 'created_at', 'id'),
+    )
+    __mapper_args__ = {"version_id_col": version}
+    
     # Relationships
     bookmarked_by = relationship("User", secondary=user_bookmarks, back_populates="bookmarks")
     notes = relationship("UserNote", back_populates="book")
+    tag_entries = relationship("Tag", secondary=book_tags, viewonly=True)
+
+class Tag(Base):
+    __tablename__ = "tags"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+    
+    books = relationship("Book", secondary=book_tags, viewonly=True)
+
+class BookNeighbor(Base):
+    """Precomputed top-K related books, one row per (kind, book, rank)."""
+    __tablename__ = "book_neighbors"
+    
+    kind = Column(String, primary_key=True)  # also_bookmarked
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    neighbor_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
+    score = Column(Float, nullable=False)
+
+@event.listens_for(Book, "after_insert")
+@event.listens_for(Book, "after_update")
+def _sync_book_tags(mapper, connection, book):
+    """Keep book_tags in step with the JSON tags column."""
+    if not inspect(book).attrs.tags.history.has_changes():
+        return
+    from tagging import normalize_tags, sync_book_tags
+    sync_book_tags(connection, book.id, normalize_tags(book.tags))
+
+# Full-text search indexes for books (queried through search.py).
+# PostgreSQL keeps a generated tsvector column with a GIN index; SQLite keeps
+# an external-content FTS5 table in sync with triggers.
+_books_search_ddl = [
+    DDL("""
+        ALTER TABLE books ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(author, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+    """).execute_if(dialect="postgresql"),
+    DDL(
+        "CREATE INDEX IF NOT EXISTS ix_books_search_vector ON books USING GIN (search_vector)"
+    ).execute_if(dialect="postgresql"),
+    DDL("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author, description,
+            content='books', content_rowid='id', tokenize='porter unicode61'
+        )
+    """).execute_if(dialect="sqlite"),
+    DDL("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts(rowid, title, author, description)
+            VALUES (new.id, new.title, new.author, new.description);
+        END
+    """).execute_if(dialect="sqlite"),
+    DDL("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, description)
+            VALUES ('delete', old.id, old.title, old.author, old.description);
+        END
+    """).execute_if(dialect="sqlite"),
+    DDL("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author, description ON books BEGIN
+            INSERT INTO books_fts(books_fts, rowid, title, author, description)
+            VALUES ('delete', old.id, old.title, old.author, old.description);
+            INSERT INTO books_fts(rowid, title, author, description)
+            VALUES (new.id, new.title, new.author, new.description);
+        END
+    """).execute_if(dialect="sqlite"),
+    DDL("INSERT INTO books_fts(books_fts) VALUES ('rebuild')").execute_if(dialect="sqlite"),
+]
+for _ddl in _books_search_ddl:
+    event.listen(Book.__table__, "after_create", _ddl)
+event.listen(
+    Book.__table__, "before_drop",
+    DDL("DROP TABLE IF EXISTS books_fts").execute_if(dialect="sqlite")
+)
 
 class UserNote(Base):
     __tablename__ = "user_notes"
@@ -83,6 +184,11 @@ class UserNote(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    __table_args__ = (
+        # Per-user keyset pages, newest first (ids follow created_at)
+        Index('ix_user_notes_user_id_id', 'user_id', 'id'),
+    )
+    
     user = relationship("User", back_populates="notes")
     book = relationship("Book", back_populates="notes")
 
@@ -97,6 +203,10 @@ class Feedback(Base):
     status = Column(String, default="pending")  # pending, in_progress, resolved
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        Index('ix_feedback_user_id_id', 'user_id', 'id'),
+    )
+    
     user = relationship("User", back_populates="feedback")
 
 class ContactRequest(Base):
@@ -128,6 +238,11 @@ class SurveyResponse(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     responses = Column(Text, nullable=False)  # JSON string for responses
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # One response per user and survey; anonymous (NULL user) responses are not limited
+        Index('ix_survey_responses_survey_id_user_id', 'survey_id', 'user_id', unique=True),
+    )
 
 class Notification(Base):
     __tablename__ = "notifications"
@@ -140,3 +255,16 @@ class Notification(Base):
     is_sent = Column(Boolean, default=False)
     sent_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        Index('ix_notifications_user_id_id', 'user_id', 'id'),
+    )
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    
+    id = Column(Integer, primary_key=True)  # Sync cursor for other workers
+    jti = Column(String, unique=True, nullable=False)
+    username = Column(String, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)  # Safe to purge after this
+    revoked_at = Column(DateTime(timezone=True), server_default=func.now())
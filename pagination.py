@@ -0,0 +1,98 @@
+import base64
+import binascii
+import json
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+
+# Response header carrying the opaque cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class SortKey:
+    """A column or expression the keyset is ordered by."""
+
+    def __init__(self, expression, descending: bool = False):
+        self.expression = expression
+        self.descending = descending
+
+    def order_by(self):
+        return self.expression.desc() if self.descending else self.expression.asc()
+
+    def after(self, value):
+        return self.expression < value if self.descending else self.expression > value
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort key values of the last row into an opaque token."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, expected_length: int) -> List[Any]:
+    """Decode a cursor token, rejecting anything this API did not issue."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        values = None
+
+    if not isinstance(values, list) or len(values) != expected_length:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    return values
+
+def _after_cursor(sort_keys: List[SortKey], values: List[Any]):
+    """Build (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... for the sort keys."""
+    clauses = []
+    for position, key in enumerate(sort_keys):
+        equal_prefix = [
+            sort_keys[i].expression == values[i] for i in range(position)
+        ]
+        clauses.append(and_(*equal_prefix, key.after(values[position])))
+    return or_(*clauses)
+
+def _page_statement(query, sort_keys: List[SortKey], limit: int, cursor: Optional[str], skip: int):
+    if cursor:
+        query = query.filter(_after_cursor(sort_keys, decode_cursor(cursor, len(sort_keys))))
+        skip = 0
+
+    return query.add_columns(
+        *[key.expression.label(f"_cursor_{i}") for i, key in enumerate(sort_keys)]
+    ).order_by(*[key.order_by() for key in sort_keys]).offset(skip).limit(limit + 1)
+
+def _split_page(rows: list, limit: int) -> Tuple[list, Optional[str]]:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(list(rows[-1][1:]))
+
+    return [row[0] for row in rows], next_cursor
+
+def paginate(
+    query,
+    sort_keys: List[SortKey],
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Tuple[list, Optional[str]]:
+    """Return one page of a query and the cursor for the page after it.
+
+    The query is ordered by the sort keys and resumed with a WHERE condition on
+    them, so every page costs the same index range scan regardless of depth.
+    The last sort key must be unique (normally the primary key). ``skip`` is
+    kept for offset-based clients and is ignored once a cursor is supplied.
+    """
+    rows = _page_statement(query, sort_keys, limit, cursor, skip).all()
+    return _split_page(rows, limit)
+
+async def paginate_async(
+    db,
+    statement,
+    sort_keys: List[SortKey],
+    limit: int,
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Tuple[list, Optional[str]]:
+    """paginate() for a select() statement executed on an AsyncSession."""
+    result = await db.execute(_page_statement(statement, sort_keys, limit, cursor, skip))
+    return _split_page(result.all(), limit)
@@ -0,0 +1,80 @@
+import threading
+import time
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from config import settings
+
+class _TimedCheckout:
+    """Records how long checkouts wait for a free pooled connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - started
+        with self._metrics_lock:
+            self.checkouts += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return connection
+
+    def metrics(self) -> dict:
+        with self._metrics_lock:
+            return {
+                "size": self.size(),
+                "max_overflow": self._max_overflow,
+                "checked_out": self.checkedout(),
+                "idle": self.checkedin(),
+                # overflow() counts up from -size; only the positive part is extra connections
+                "overflow": max(self.overflow(), 0),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "average_wait_ms": 1000 * self.wait_seconds / self.checkouts if self.checkouts else 0.0,
+                "max_wait_ms": 1000 * self.max_wait_seconds
+            }
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+def _statement_timeout_args(driver: str) -> dict:
+    milliseconds = settings.DB_STATEMENT_TIMEOUT_MS
+    if not milliseconds:
+        return {}
+    if driver == "asyncpg":
+        return {"server_settings": {"statement_timeout": str(milliseconds)}}
+    return {"options": f"-c statement_timeout={milliseconds}"}
+
+def engine_options(url: str, asynchronous: bool = False) -> dict:
+    """create_engine() keyword arguments for the configured pool."""
+    options = {
+        "poolclass": InstrumentedAsyncQueuePool if asynchronous else InstrumentedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING
+    }
+    # statement_timeout is a PostgreSQL setting, applied once per new connection
+    if url.startswith("postgresql"):
+        options["connect_args"] = _statement_timeout_args("asyncpg" if asynchronous else "psycopg2")
+    return options
+
+def pool_metrics(engine) -> dict:
+    """Live pool occupancy and checkout wait times of an engine."""
+    pool = engine.pool
+    return pool.metrics() if isinstance(pool, _TimedCheckout) else {"status": pool.status()}
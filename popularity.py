@@ -0,0 +1,34 @@
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Book, user_bookmarks
+
+def bookmark_count_update(book_id: int, delta: int):
+    """UPDATE that atomically adds delta to a book's denormalized bookmark counter."""
+    return (
+        update(Book)
+        .where(Book.id == book_id)
+        .values(bookmark_count=Book.bookmark_count + delta, version=Book.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+def reconcile_bookmark_counts(db: Session) -> int:
+    """Rebuild bookmark counters from user_bookmarks; return the rows fixed."""
+    actual = select(func.count()).where(
+        user_bookmarks.c.book_id == Book.id
+    ).scalar_subquery()
+    result = db.execute(
+        update(Book)
+        .where(Book.bookmark_count != actual)
+        .values(bookmark_count=actual, version=Book.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print(f"Reconciled bookmark counts for {reconcile_bookmark_counts(db)} books")
+    finally:
+        db.close()
@@ -0,0 +1,112 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from config import settings
+from metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = "X-DB-Queries"
+QUERY_TIME_HEADER = "X-DB-Time-Ms"
+REPEATED_HEADER = "X-DB-Repeated-Statements"
+
+class QueryStats:
+    """Statements executed within one request (or count_queries block)."""
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+        self.parent = parent
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+        if self.parent is not None:
+            self.parent.record(statement, seconds)
+
+    def repeated(self, threshold: Optional[int] = None) -> Dict[str, int]:
+        """Statements run at least threshold times: likely N+1 loops.
+
+        Statements are compared with their bound parameters left out, so a
+        per-row lookup repeated with different IDs counts as one statement.
+        """
+        threshold = threshold or settings.SQL_REPEATED_STATEMENT_THRESHOLD
+        return {statement: count for statement, count in self.statements.items() if count >= threshold}
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+@contextmanager
+def count_queries():
+    """Collect the statements run by this context (including async sessions) into a QueryStats.
+
+    Blocks nest: statements are also counted by every enclosing block.
+    """
+    stats = QueryStats(_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+# Registered on the Engine class, so every engine (sync, async, replicas) is counted
+# The start time lives on the per-statement execution context, so a failed
+# statement (which never reaches after_cursor_execute) leaves nothing behind
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._query_start_time = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, "_query_start_time", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+class QueryStatsMiddleware:
+    """Reports statement count and DB time per request.
+
+    Adds X-DB-* response headers and logs one line per request; repeated
+    identical statements are logged as warnings. Statements issued while a
+    streaming body is sent are logged but miss the already-sent headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers[QUERY_COUNT_HEADER] = str(stats.count)
+                headers[QUERY_TIME_HEADER] = f"{stats.seconds * 1000:.2f}"
+                repeated = stats.repeated()
+                if repeated:
+                    headers[REPEATED_HEADER] = str(len(repeated))
+            await send(message)
+
+        with count_queries() as stats:
+            await self.app(scope, receive, send_with_stats)
+
+        path = route_template(scope)
+        logger.info(
+            "%s %s ran %d statements in %.2f ms", scope["method"], path, stats.count, stats.seconds * 1000,
+            extra={"db_queries": stats.count, "db_time_ms": stats.seconds * 1000, "route": path}
+        )
+        for statement, count in stats.repeated().items():
+            logger.warning(
+                "Probable N+1 in %s %s: statement ran %d times: %s",
+                scope["method"], path, count, " ".join(statement.split())[:200]
+            )
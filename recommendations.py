@@ -0,0 +1,169 @@
+import argparse
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import delete, insert, select
+from sqlalchemy.engine import Connection, Engine
+from models import BookNeighbor, user_bookmarks
+
+ALSO_BOOKMARKED = "also_bookmarked"
+
+DEFAULT_TOP_K = 20
+# Book rows multiplied per step; bounds the dense-ish intermediate product
+DEFAULT_BLOCK_SIZE = 2048
+LOAD_BATCH_SIZE = 100_000
+INSERT_BATCH_SIZE = 10_000
+
+def _load_interactions(connection: Connection) -> Tuple[np.ndarray, np.ndarray]:
+    """Read (user_id, book_id) pairs into two int64 arrays, batch by batch."""
+    user_chunks, book_chunks = [], []
+    result = connection.execution_options(yield_per=LOAD_BATCH_SIZE).execute(
+        select(user_bookmarks.c.user_id, user_bookmarks.c.book_id)
+    )
+    for rows in result.partitions():
+        pairs = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        user_chunks.append(pairs[:, 0])
+        book_chunks.append(pairs[:, 1])
+    if not user_chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(user_chunks), np.concatenate(book_chunks)
+
+def rank_within_rows(rows: np.ndarray, scores: np.ndarray, tiebreak: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return an order sorting entries by row then best score, and each entry's rank in its row."""
+    order = np.lexsort((tiebreak, -scores, rows))
+    rows = rows[order]
+    starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else np.empty(0, dtype=np.int64)
+    ranks = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+    return order, ranks
+
+def top_k_per_row(
+    matrix: sp.spmatrix,
+    row_offset: int,
+    top_k: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Return (row, column, score, rank) for the top_k entries of each row."""
+    matrix = matrix.tocsr()
+    indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+    # Cut long rows down with a partial sort so only a few entries get fully sorted
+    lengths = np.diff(indptr)
+    row_of = np.repeat(np.arange(len(lengths)), lengths)
+    selected = [np.flatnonzero(lengths[row_of] <= top_k + 1)]
+    for row in np.flatnonzero(lengths > top_k + 1):
+        start = indptr[row]
+        selected.append(start + np.argpartition(-data[start:indptr[row + 1]], top_k)[:top_k + 1])
+    positions = np.concatenate(selected)
+    rows, columns, scores = row_of[positions], indices[positions], data[positions]
+
+    # A book is trivially its own best neighbour
+    keep = columns != rows + row_offset
+    rows, columns, scores = rows[keep], columns[keep], scores[keep]
+
+    # Column breaks ties so results are stable
+    order, ranks = rank_within_rows(rows, scores, columns)
+    rows, columns, scores = rows[order], columns[order], scores[order]
+    keep = ranks < top_k
+    return rows[keep] + row_offset, columns[keep], scores[keep], ranks[keep]
+
+def compute_also_bookmarked(
+    user_ids: np.ndarray,
+    book_ids: np.ndarray,
+    top_k: int = DEFAULT_TOP_K,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    min_shared: int = 1
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield top-K cosine neighbours as (book_id, neighbor_id, score, rank) arrays.
+
+    Users and books are mapped to dense indexes and stacked into a binary
+    users x books CSR matrix X. Item-item co-occurrence X^T X is computed a
+    block of book rows at a time, so peak memory follows the block rather
+    than the full book x book product.
+    """
+    if len(user_ids) == 0:
+        return
+    user_keys, user_index = np.unique(user_ids, return_inverse=True)
+    book_keys, book_index = np.unique(book_ids, return_inverse=True)
+    interactions = sp.csr_matrix(
+        (np.ones(len(user_index), dtype=np.float32), (user_index, book_index)),
+        shape=(len(user_keys), len(book_keys))
+    )
+    interactions.data[:] = 1.0  # Duplicate pairs collapse to one bookmark
+    by_book = interactions.T.tocsr()
+    readers = np.asarray(by_book.sum(axis=1)).ravel()
+    norms = np.sqrt(readers)
+
+    for start in range(0, len(book_keys), block_size):
+        shared = (by_book[start:start + block_size] @ interactions).tocsr()
+        if min_shared > 1:
+            shared.data[shared.data < min_shared] = 0
+            shared.eliminate_zeros()
+        # Cosine similarity: shared readers / sqrt(readers_i * readers_j)
+        row_of = np.repeat(np.arange(shared.shape[0]), np.diff(shared.indptr))
+        shared.data /= norms[row_of + start] * norms[shared.indices]
+        rows, columns, scores, ranks = top_k_per_row(shared, start, top_k)
+        if len(rows):
+            yield book_keys[rows], book_keys[columns], scores, ranks
+
+def store_neighbors(
+    connection: Connection,
+    kind: str,
+    blocks: Iterable[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]],
+    book_ids: Optional[List[int]] = None
+) -> int:
+    """Replace the neighbour rows of one kind, or only those of book_ids.
+
+    Returns the number of rows written.
+    """
+    statement = delete(BookNeighbor).where(BookNeighbor.kind == kind)
+    if book_ids is not None:
+        statement = statement.where(BookNeighbor.book_id.in_(book_ids))
+    connection.execute(statement)
+    written = 0
+    for sources, neighbor_ids, scores, ranks in blocks:
+        for offset in range(0, len(sources), INSERT_BATCH_SIZE):
+            window = slice(offset, offset + INSERT_BATCH_SIZE)
+            connection.execute(insert(BookNeighbor), [
+                {"kind": kind, "book_id": book_id, "rank": rank, "neighbor_id": neighbor_id, "score": score}
+                for book_id, neighbor_id, score, rank in zip(
+                    sources[window].tolist(), neighbor_ids[window].tolist(),
+                    scores[window].tolist(), ranks[window].tolist()
+                )
+            ])
+        written += len(sources)
+    return written
+
+def rebuild_also_bookmarked(
+    engine: Engine,
+    top_k: int = DEFAULT_TOP_K,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+    min_shared: int = 1
+) -> dict:
+    """Recompute "readers also bookmarked" neighbours in one transaction."""
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        user_ids, book_ids = _load_interactions(connection)
+        loaded = time.perf_counter()
+        written = store_neighbors(
+            connection,
+            ALSO_BOOKMARKED,
+            compute_also_bookmarked(user_ids, book_ids, top_k, block_size, min_shared)
+        )
+    finished = time.perf_counter()
+    return {
+        "bookmarks": len(user_ids),
+        "users": len(np.unique(user_ids)),
+        "books": len(np.unique(book_ids)),
+        "neighbors_written": written,
+        "load_seconds": round(loaded - started, 3),
+        "total_seconds": round(finished - started, 3)
+    }
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Rebuild 'readers also bookmarked' recommendations.")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument("--min-shared", type=int, default=1, help="Minimum readers two books must share")
+    args = parser.parse_args()
+    print(rebuild_also_bookmarked(engine, args.top_k, args.block_size, args.min_shared))
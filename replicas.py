@@ -0,0 +1,96 @@
+import asyncio
+import itertools
+import time
+from typing import List, Optional
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from metrics import timed_task
+from pooling import engine_options, pool_metrics
+
+# Sync URL schemes and the async drivers used for them
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_driver_url(url: str) -> str:
+    scheme, separator, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + separator + rest
+
+class Replica:
+    """A read replica with its own async engine and health state."""
+
+    def __init__(self, url: str):
+        self.url = async_driver_url(url)
+        self.engine = create_async_engine(self.url, **engine_options(self.url, asynchronous=True))
+        self.sessionmaker = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+        self.healthy = True
+        self.failures = 0
+        self.checked_at = None
+        self.error = None
+
+    async def check(self, timeout: float):
+        try:
+            async with self.engine.connect() as connection:
+                await asyncio.wait_for(connection.execute(text("SELECT 1")), timeout)
+        except Exception as exc:
+            self.mark_failed(exc)
+        else:
+            self.healthy = True
+            self.error = None
+        self.checked_at = time.time()
+
+    def mark_failed(self, exc: Exception):
+        self.healthy = False
+        self.failures += 1
+        self.error = f"{type(exc).__name__}: {exc}"[:200]
+
+class ReplicaRouter:
+    """Round-robins read sessions over the replicas that passed their last check.
+
+    Replicas are probed every check_interval seconds; a replica whose
+    connection breaks mid-request is taken out until its next successful
+    probe. With no healthy replica, reads fall back to the primary.
+    """
+
+    def __init__(self, urls: List[str], check_interval: float, check_timeout: float):
+        self.replicas = [Replica(url) for url in urls]
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._turn = itertools.count()
+        self.fallbacks = 0
+
+    def choose(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            if self.replicas:
+                self.fallbacks += 1
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    @timed_task("replica_health_check")
+    async def check(self):
+        await asyncio.gather(*(replica.check(self.check_timeout) for replica in self.replicas))
+
+    async def run_health_checks(self):
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "fallbacks_to_primary": self.fallbacks,
+            "replicas": [
+                {
+                    # Credentials stay out of the health output
+                    "host": replica.engine.url.host or replica.engine.url.database,
+                    "healthy": replica.healthy,
+                    "failures": replica.failures,
+                    "checked_at": replica.checked_at,
+                    "error": replica.error,
+                    "pool": pool_metrics(replica.engine.sync_engine)
+                }
+                for replica in self.replicas
+            ]
+        }
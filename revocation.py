@@ -0,0 +1,190 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from config import settings
+from database import SessionLocal
+from models import RevokedToken
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        # Lazy, so membership checks stop at the first unset bit
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+class RevocationList:
+    """Answers "is this token ID revoked?" without a query per request.
+
+    Revoked IDs are mirrored from revoked_tokens into a Bloom filter. A miss
+    is definitive; a hit is confirmed against the table, so false positives
+    cost one lookup and never reject a valid token. Revocations made by
+    other workers are picked up every REVOCATION_SYNC_SECONDS.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, sync_seconds: float, sync_overlap: int):
+        # Guards the filter swap only; never held across a query, since async
+        # routes reach this code on the event-loop thread through run_sync
+        self._lock = threading.Lock()
+        # Held by the one caller refreshing from the table; others skip the refresh
+        self._refreshing = threading.Lock()
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._added_during_rebuild = None
+        self.error_rate = error_rate
+        self.sync_seconds = sync_seconds
+        self._synced_at = None  # monotonic time of the last sync
+        self.sync_overlap = sync_overlap
+        self._watermark = None  # highest revoked_tokens.id seen
+        self.checks = 0
+        self.confirmed = 0
+        self.false_positives = 0
+
+    def _add_all(self, jtis: Iterable[str]) -> bool:
+        """Add IDs to the filter; return True when it has outgrown its capacity."""
+        with self._lock:
+            for jti in jtis:
+                if jti not in self._bloom:
+                    self._bloom.add(jti)
+                if self._added_during_rebuild is not None:
+                    self._added_during_rebuild.append(jti)
+            return self._bloom.count > self._bloom.capacity
+
+    def _rebuild(self, db: Session):
+        # Over capacity the error rate climbs; reload live revocations into a larger filter.
+        # IDs added while the query runs are replayed into the new filter before the swap.
+        with self._lock:
+            self._added_during_rebuild = []
+        try:
+            jtis = [jti for jti, in db.query(RevokedToken.jti).filter(
+                RevokedToken.expires_at > datetime.now(timezone.utc)
+            )]
+        except Exception:
+            with self._lock:
+                self._added_during_rebuild = None
+            raise
+        with self._lock:
+            jtis.extend(self._added_during_rebuild)
+            self._added_during_rebuild = None
+            bloom = BloomFilter(max(2 * len(jtis), self._bloom.capacity), self.error_rate)
+            for jti in jtis:
+                bloom.add(jti)
+            self._bloom = bloom
+
+    def _due(self, now: float) -> bool:
+        return self._synced_at is None or now - self._synced_at >= self.sync_seconds
+
+    def _sync(self, db: Session):
+        now = time.monotonic()
+        if not self._due(now):
+            return
+        # A caller that finds a refresh under way keeps using the current filter
+        if not self._refreshing.acquire(blocking=False):
+            return
+        try:
+            if not self._due(now):
+                return
+            query = db.query(RevokedToken.id, RevokedToken.jti).filter(
+                RevokedToken.expires_at > datetime.now(timezone.utc)
+            )
+            if self._watermark is not None:
+                # Ids are drawn at insert, not commit, so a revocation can become
+                # visible after one with a higher id; re-read a window below the watermark
+                query = query.filter(RevokedToken.id > self._watermark - self.sync_overlap)
+            rows = query.all()
+            if self._add_all(jti for _, jti in rows):
+                self._rebuild(db)
+            if rows:
+                self._watermark = max(self._watermark or 0, max(row_id for row_id, _ in rows))
+            self._synced_at = now
+        finally:
+            self._refreshing.release()
+
+    def is_revoked(self, jti: str, db: Optional[Session] = None) -> bool:
+        session = db or SessionLocal()
+        try:
+            self._sync(session)
+            self.checks += 1
+            if jti not in self._bloom:
+                return False
+            revoked = session.query(RevokedToken.id).filter(RevokedToken.jti == jti).first() is not None
+            if revoked:
+                self.confirmed += 1
+            else:
+                self.false_positives += 1
+            return revoked
+        finally:
+            if db is None:
+                session.close()
+
+    def revoke(self, db: Session, jti: str, expires_at: datetime, username: Optional[str] = None) -> bool:
+        """Record a revocation; return False if the ID was already revoked."""
+        db.add(RevokedToken(jti=jti, username=username, expires_at=expires_at))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            return False
+        if self._add_all([jti]) and self._refreshing.acquire(blocking=False):
+            try:
+                self._rebuild(db)
+            finally:
+                self._refreshing.release()
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": self._bloom.count,
+                "capacity": self._bloom.capacity,
+                "bits": self._bloom.size,
+                "hashes": self._bloom.hashes,
+                "checks": self.checks,
+                "confirmed_revocations": self.confirmed,
+                "false_positives": self.false_positives
+            }
+
+revocation_list = RevocationList(
+    settings.REVOCATION_BLOOM_CAPACITY,
+    settings.REVOCATION_BLOOM_ERROR_RATE,
+    settings.REVOCATION_SYNC_SECONDS,
+    settings.REVOCATION_SYNC_ID_OVERLAP
+)
+
+def purge_expired_revocations(db: Session) -> int:
+    """Delete revocations of tokens that have expired anyway; return the rows removed."""
+    removed = db.query(RevokedToken).filter(
+        RevokedToken.expires_at <= datetime.now(timezone.utc)
+    ).delete(synchronize_session=False)
+    db.commit()
+    return removed
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print(f"Purged {purge_expired_revocations(db)} expired token revocations")
+    finally:
+        db.close()
@@ -1,19 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from database import get_async_db
 from models import User
-from schemas import UserCreate, UserResponse, LoginRequest, Token
-from auth_utils import verify_password, get_password_hash, create_access_token, get_current_active_user
+from schemas import UserCreate, UserResponse, LoginRequest, Token, RefreshRequest
+from auth_utils import (
+    hash_password_async, verify_password_async, create_access_token, create_refresh_token,
+    decode_token, revoke_token, get_current_active_user, password_hasher, security
+)
+from revocation import revocation_list
+from cache import principal_cache
+from throttling import login_throttle
 
 router = APIRouter()
 
 @router.post("/register", response_model=UserResponse)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user."""
     # Check if user already exists
-    db_user = db.query(User).filter(
+    db_user = (await db.execute(select(User).where(
         (User.email == user.email) | (User.username == user.username)
-    ).first()
+    ))).scalars().first()
     
     if db_user:
         raise HTTPException(
@@ -22,7 +31,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password_async(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
@@ -31,18 +40,24 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     return db_user
 
 @router.post("/login", response_model=Token)
-async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login(login_data: LoginRequest, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Login user and return access token."""
+    # Reject floods before any query or bcrypt work
+    await login_throttle.check(login_data.username, request.client.host if request.client else None)
+    
     # Authenticate user
-    user = db.query(User).filter(User.username == login_data.username).first()
+    user = (await db.execute(select(User).where(User.username == login_data.username))).scalar_one_or_none()
+    verified, new_hash = False, None
+    if user:
+        verified, new_hash = await verify_password_async(login_data.password, user.hashed_password)
     
-    if not user or not verify_password(login_data.password, user.hashed_password):
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -55,17 +70,83 @@ async def login(login_data: LoginRequest, db: Session = Depends(get_db)):
             detail="Inactive user"
         )
     
+    await login_throttle.succeeded(user.username)
+    
+    # Upgrade hashes created with an older work factor
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
+    
     # Create access token
-    access_token = create_access_token(data={"sub": user.username})
+    return _issue_tokens(user.username)
+
+def _issue_tokens(username: str) -> dict:
+    return {
+        "access_token": create_access_token(data={"sub": username}),
+        "token_type": "bearer",
+        "refresh_token": create_refresh_token(username)
+    }
+
+@router.post("/refresh", response_model=Token)
+async def refresh(refresh_request: RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    """Exchange a refresh token for new tokens without re-checking the password."""
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    # Revocation bookkeeping is shared with sync callers, so it runs on the sync facade
+    payload = await db.run_sync(lambda session: decode_token(refresh_request.refresh_token, "refresh", session))
+    # Rotation: revoking the presented token makes every refresh token single-use
+    if payload is None or not await db.run_sync(revoke_token, payload):
+        raise invalid_token
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    user = (await db.execute(select(User).where(User.username == payload["sub"]))).scalar_one_or_none()
+    if not user or not user.is_active:
+        raise invalid_token
+    
+    return _issue_tokens(user.username)
 
 @router.get("/me", response_model=UserResponse)
 async def get_current_user_info(current_user: User = Depends(get_current_active_user)):
     """Get current user information."""
     return current_user
 
+@router.get("/cache/stats")
+async def get_principal_cache_stats():
+    """Get hit, miss and eviction counters of the authenticated-principal cache."""
+    return principal_cache.stats()
+
+@router.get("/hashing/stats")
+async def get_password_hashing_stats():
+    """Get throughput and queue depth of the password hashing pool."""
+    return password_hasher.stats()
+
+@router.get("/revocation/stats")
+async def get_revocation_stats():
+    """Get size and hit counters of the token revocation filter."""
+    return revocation_list.stats()
+
 @router.post("/logout")
-async def logout():
-    """Logout user (client should discard the token)."""
+async def logout(
+    refresh_request: Optional[RefreshRequest] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Logout user by revoking the access token and, if given, the refresh token."""
+    payload = await db.run_sync(lambda session: decode_token(credentials.credentials, "access", session))
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if payload.get("jti"):
+        await db.run_sync(revoke_token, payload)
+    if refresh_request:
+        refresh_payload = await db.run_sync(
+            lambda session: decode_token(refresh_request.refresh_token, "refresh", session)
+        )
+        if refresh_payload and refresh_payload["sub"] == payload["sub"]:
+            await db.run_sync(revoke_token, refresh_payload)
     return {"message": "Successfully logged out"}
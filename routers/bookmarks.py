@@ -1,48 +1,64 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from database import get_async_db
 from models import User, Book, UserNote, user_bookmarks
 from schemas import BookResponse, UserNoteCreate, UserNoteResponse
 from auth_utils import get_current_active_user
+from pagination import SortKey, paginate_async, NEXT_CURSOR_HEADER
+from cache import mark_featured_changed
+from popularity import bookmark_count_update
+from serialization import books_response
 
 router = APIRouter()
 
 @router.get("/", response_model=List[BookResponse])
 async def get_user_bookmarks(
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    limit: int = Query(50, ge=1, le=100, description="Number of records to return"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user's bookmarked books."""
-    bookmarks = db.query(Book).join(user_bookmarks).filter(
+    statement = select(Book).join(user_bookmarks).where(
         user_bookmarks.c.user_id == current_user.id
-    ).all()
-    return bookmarks
+    )
+    bookmarks, next_cursor = await paginate_async(db, statement, [SortKey(Book.id)], limit, cursor=cursor)
+    return books_response(bookmarks, {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
 
 @router.get("/notes", response_model=List[UserNoteResponse])
 async def get_user_notes(
+    response: Response,
     book_id: int = None,
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    limit: int = Query(50, ge=1, le=100, description="Number of records to return"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user's notes, optionally filtered by book."""
-    query = db.query(UserNote).filter(UserNote.user_id == current_user.id)
+    statement = select(UserNote).where(UserNote.user_id == current_user.id)
     
     if book_id:
-        query = query.filter(UserNote.book_id == book_id)
+        statement = statement.where(UserNote.book_id == book_id)
     
-    notes = query.order_by(UserNote.created_at.desc()).all()
+    # Newest first; ids follow insertion order, so they double as the keyset
+    notes, next_cursor = await paginate_async(
+        db, statement, [SortKey(UserNote.id, descending=True)], limit, cursor=cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return notes
 
 @router.post("/notes", response_model=UserNoteResponse)
 async def create_note(
     note: UserNoteCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new note for a book."""
     # Check if book exists
-    book = db.query(Book).filter(Book.id == note.book_id).first()
+    book = await db.get(Book, note.book_id)
     if not book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -58,8 +74,8 @@ async def create_note(
     )
     
     db.add(db_note)
-    db.commit()
-    db.refresh(db_note)
+    await db.commit()
+    await db.refresh(db_note)
     
     return db_note
 
@@ -68,13 +84,13 @@ async def update_note(
     note_id: int,
     note_text: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a user's note."""
-    note = db.query(UserNote).filter(
+    note = (await db.execute(select(UserNote).where(
         UserNote.id == note_id,
         UserNote.user_id == current_user.id
-    ).first()
+    ))).scalar_one_or_none()
     
     if not note:
         raise HTTPException(
@@ -83,8 +99,8 @@ async def update_note(
         )
     
     note.note_text = note_text
-    db.commit()
-    db.refresh(note)
+    await db.commit()
+    await db.refresh(note)
     
     return note
 
@@ -92,13 +108,13 @@ async def update_note(
 async def delete_note(
     note_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a user's note."""
-    note = db.query(UserNote).filter(
+    note = (await db.execute(select(UserNote).where(
         UserNote.id == note_id,
         UserNote.user_id == current_user.id
-    ).first()
+    ))).scalar_one_or_none()
     
     if not note:
         raise HTTPException(
@@ -106,8 +122,8 @@ async def delete_note(
             detail="Note not found"
         )
     
-    db.delete(note)
-    db.commit()
+    await db.delete(note)
+    await db.commit()
     
     return {"message": "Note deleted successfully"}
 
@@ -115,11 +131,11 @@ async def delete_note(
 async def add_bookmark(
     book_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Add a book to user's bookmarks."""
     # Check if book exists
-    book = db.query(Book).filter(Book.id == book_id).first()
+    book = await db.get(Book, book_id)
     if not book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -127,10 +143,10 @@ async def add_bookmark(
         )
     
     # Check if already bookmarked
-    existing_bookmark = db.query(user_bookmarks).filter(
+    existing_bookmark = (await db.execute(select(user_bookmarks).where(
         user_bookmarks.c.user_id == current_user.id,
         user_bookmarks.c.book_id == book_id
-    ).first()
+    ))).first()
     
     if existing_bookmark:
         raise HTTPException(
@@ -139,13 +155,16 @@ async def add_bookmark(
         )
     
     # Add bookmark
-    db.execute(
+    await db.execute(
         user_bookmarks.insert().values(
             user_id=current_user.id,
             book_id=book_id
         )
     )
-    db.commit()
+    await db.execute(bookmark_count_update(book_id, 1))
+    # Only the featured payload carries bookmark_count
+    mark_featured_changed(db)
+    await db.commit()
     
     return {"message": "Book bookmarked successfully"}
 
@@ -153,28 +172,27 @@ async def add_bookmark(
 async def remove_bookmark(
     book_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Remove a book from user's bookmarks."""
-    # Check if bookmark exists
-    existing_bookmark = db.query(user_bookmarks).filter(
-        user_bookmarks.c.user_id == current_user.id,
-        user_bookmarks.c.book_id == book_id
-    ).first()
+    result = await db.execute(
+        user_bookmarks.delete().where(
+            user_bookmarks.c.user_id == current_user.id,
+            user_bookmarks.c.book_id == book_id
+        )
+    )
     
-    if not existing_bookmark:
+    # Only the request that actually deleted the row decrements the counter
+    if result.rowcount != 1:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Bookmark not found"
         )
     
-    # Remove bookmark
-    db.execute(
-        user_bookmarks.delete().where(
-            user_bookmarks.c.user_id == current_user.id,
-            user_bookmarks.c.book_id == book_id
-        )
-    )
-    db.commit()
+    await db.execute(bookmark_count_update(book_id, -1))
+    # Only the featured payload carries bookmark_count
+    mark_featured_changed(db)
+    await db.commit()
     
     return {"message": "Bookmark removed successfully"}
\ No newline at end of file
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from database import get_db
+from database import get_async_db, get_read_db
 from models import User, Feedback, ContactRequest, Survey, SurveyResponse, Book
 from schemas import FeedbackCreate, FeedbackResponse, ContactRequestCreate, ContactRequestResponse, SurveyResponseCreate
 from auth_utils import get_current_active_user
+from pagination import SortKey, paginate_async, NEXT_CURSOR_HEADER
+from http_cache import conditional_json_response
+from config import settings
 
 router = APIRouter()
 
@@ -13,7 +18,7 @@ router = APIRouter()
 async def submit_feedback(
     feedback: FeedbackCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit feedback."""
     db_feedback = Feedback(
@@ -24,25 +29,33 @@ async def submit_feedback(
     )
     
     db.add(db_feedback)
-    db.commit()
-    db.refresh(db_feedback)
+    await db.commit()
+    await db.refresh(db_feedback)
     
     return db_feedback
 
 @router.get("/feedback", response_model=List[FeedbackResponse])
 async def get_user_feedback(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    limit: int = Query(50, ge=1, le=100, description="Number of records to return"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user's feedback submissions."""
-    feedback = db.query(Feedback).filter(Feedback.user_id == current_user.id).order_by(Feedback.created_at.desc()).all()
+    statement = select(Feedback).where(Feedback.user_id == current_user.id)
+    feedback, next_cursor = await paginate_async(
+        db, statement, [SortKey(Feedback.id, descending=True)], limit, cursor=cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     return feedback
 
 # Contact request endpoints
 @router.post("/contact", response_model=ContactRequestResponse)
 async def submit_contact_request(
     contact: ContactRequestCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit a contact request."""
     db_contact = ContactRequest(
@@ -53,22 +66,22 @@ async def submit_contact_request(
     )
     
     db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
+    await db.commit()
+    await db.refresh(db_contact)
     
     return db_contact
 
 # Survey endpoints
 @router.get("/surveys")
-async def get_active_surveys(db: Session = Depends(get_db)):
+async def get_active_surveys(request: Request, db: AsyncSession = Depends(get_read_db)):
     """Get active surveys."""
-    surveys = db.query(Survey).filter(Survey.is_active == True).all()
-    return surveys
+    surveys = (await db.execute(select(Survey).where(Survey.is_active == True))).scalars().all()
+    return conditional_json_response(request, surveys)
 
 @router.get("/surveys/{survey_id}")
-async def get_survey(survey_id: int, db: Session = Depends(get_db)):
+async def get_survey(survey_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get a specific survey."""
-    survey = db.query(Survey).filter(Survey.id == survey_id).first()
+    survey = await db.get(Survey, survey_id)
     if not survey:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -81,14 +94,14 @@ async def respond_to_survey(
     survey_id: int,
     response: SurveyResponseCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Submit a survey response."""
     # Check if survey exists and is active
-    survey = db.query(Survey).filter(
+    survey = (await db.execute(select(Survey).where(
         Survey.id == survey_id,
         Survey.is_active == True
-    ).first()
+    ))).scalar_one_or_none()
     
     if not survey:
         raise HTTPException(
@@ -97,10 +110,10 @@ async def respond_to_survey(
         )
     
     # Check if user already responded
-    existing_response = db.query(SurveyResponse).filter(
+    existing_response = (await db.execute(select(SurveyResponse).where(
         SurveyResponse.survey_id == survey_id,
         SurveyResponse.user_id == current_user.id
-    ).first()
+    ))).scalars().first()
     
     if existing_response:
         raise HTTPException(
@@ -116,34 +129,43 @@ async def respond_to_survey(
     )
     
     db.add(db_response)
-    db.commit()
-    db.refresh(db_response)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent submission won the unique (survey_id, user_id) index
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User has already responded to this survey"
+        )
+    await db.refresh(db_response)
     
     return {"message": "Survey response submitted successfully"}
 
 # FAQ endpoint (simplified)
+FAQ_DATA = [
+    {
+        "question": "How do I bookmark a book?",
+        "answer": "Click the bookmark icon on any book page to add it to your bookmarks."
+    },
+    {
+        "question": "Can I read books offline?",
+        "answer": "Yes, you can download books for offline reading. Look for the download option on the book page."
+    },
+    {
+        "question": "How do I change my reading preferences?",
+        "answer": "Go to your profile settings to update your reading preferences including dark mode."
+    },
+    {
+        "question": "How do I contact support?",
+        "answer": "Use the contact form or submit feedback through the app to reach our support team."
+    }
+]
+
 @router.get("/faq")
-async def get_faq():
+async def get_faq(request: Request):
     """Get frequently asked questions."""
-    faq_data = [
-        {
-            "question": "How do I bookmark a book?",
-            "answer": "Click the bookmark icon on any book page to add it to your bookmarks."
-        },
-        {
-            "question": "Can I read books offline?",
-            "answer": "Yes, you can download books for offline reading. Look for the download option on the book page."
-        },
-        {
-            "question": "How do I change my reading preferences?",
-            "answer": "Go to your profile settings to update your reading preferences including dark mode."
-        },
-        {
-            "question": "How do I contact support?",
-            "answer": "Use the contact form or submit feedback through the app to reach our support team."
-        }
-    ]
-    return faq_data
+    return conditional_json_response(request, FAQ_DATA, max_age=settings.STATIC_CACHE_MAX_AGE_SECONDS)
 
 # Social sharing endpoint (simplified)
 @router.post("/share/{book_id}")
@@ -151,11 +173,11 @@ async def share_book(
     book_id: int,
     share_data: dict,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Share a book on social media."""
     # Check if book exists
-    book = db.query(Book).filter(Book.id == book_id).first()
+    book = await db.get(Book, book_id)
     if not book:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
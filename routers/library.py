@@ -1,25 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_
-from typing import List, Optional
-from database import get_db
-from models import Book, User
-from schemas import BookResponse, BookCreate
-from auth_utils import get_current_active_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, and_, select
+from typing import List, Optional, Union
+import io
+from database import get_async_db, get_db, get_read_db
+from models import Book, BookNeighbor, User
+from schemas import BookResponse, BookCreate, BookBatchRequest, BookBatchItem, BookSearchResponse, BookSuggestion, IngestReport
+from auth_utils import get_current_active_user, get_current_admin_user
+from search import apply_fulltext_search, apply_substring_search
+from pagination import SortKey, paginate, NEXT_CURSOR_HEADER
+from tagging import normalize_tags, filter_by_tags, tag_counts
+from cache import catalog_cache
+from facets import facet_counts
+from suggest import ensure_suggest_index
+from export import stream_export
+from ingest import ingest_books, read_records
+from isbn import normalize_isbn
+from downloads import resolve_book_file, content_etag
+from recommendations import ALSO_BOOKMARKED
+from similarity import SIMILAR, similarity_index
+from config import settings
+from serialization import book_to_dict, books_response, dump_json, json_response
+from http_cache import make_etag, is_not_modified, not_modified_response, cache_headers, conditional_json_response
 
 router = APIRouter()
 
-@router.get("/books", response_model=List[BookResponse])
+@router.get("/books", response_model=Union[List[BookResponse], BookSearchResponse])
 async def get_books(
+    request: Request,
     category: Optional[str] = Query(None, description="Filter by category"),
     search: Optional[str] = Query(None, description="Search in title, author, or description"),
+    search_mode: str = Query("fulltext", pattern="^(fulltext|substring)$", description="Ranked full-text search or substring match"),
     tags: Optional[str] = Query(None, description="Filter by tags (comma-separated)"),
-    skip: int = Query(0, ge=0, description="Number of records to skip"),
+    tag_match: str = Query("all", pattern="^(all|any)$", description="Require all or any of the tags"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    skip: int = Query(0, ge=0, description="Number of records to skip (ignored when cursor is set)"),
     limit: int = Query(10, ge=1, le=100, description="Number of records to return"),
-    db: Session = Depends(get_db)
+    facets: bool = Query(False, description="Wrap results with category, language and tag counts"),
+    facet_limit: int = Query(10, ge=1, le=50, description="Maximum values returned per facet"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get list of books with optional filtering."""
+    # The search, tag and facet helpers build legacy Query objects; run them on the sync facade
+    content, next_cursor = await db.run_sync(
+        _load_books, category, search, search_mode, tags, tag_match, cursor, skip, limit, facets, facet_limit
+    )
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return conditional_json_response(request, content, headers=headers)
+
+def _load_books(
+    db: Session, category, search, search_mode, tags, tag_match, cursor, skip, limit, facets, facet_limit
+):
     query = db.query(Book).filter(Book.is_available == True)
+    sort_keys = [SortKey(Book.id)]
     
     # Filter by category
     if category:
@@ -27,70 +63,224 @@ async def get_books(
     
     # Search functionality
     if search:
-        search_term = f"%{search}%"
-        query = query.filter(
-            or_(
-                Book.title.ilike(search_term),
-                Book.author.ilike(search_term),
-                Book.description.ilike(search_term)
-            )
-        )
+        if search_mode == "fulltext":
+            query, sort_keys = apply_fulltext_search(query, search, db.get_bind().dialect.name)
+        else:
+            query = apply_substring_search(query, search)
     
-    # Filter by tags (simplified - in production, you'd want proper tag handling)
+    # Filter by tags through the book_tags index
     if tags:
-        tag_list = [tag.strip() for tag in tags.split(",")]
-        for tag in tag_list:
-            query = query.filter(Book.tags.ilike(f"%{tag}%"))
+        tag_list = normalize_tags(tags.split(","))
+        if tag_list:
+            query = filter_by_tags(query, tag_list, match_all=tag_match == "all")
     
-    books = query.offset(skip).limit(limit).all()
-    return books
+    books, next_cursor = paginate(query, sort_keys, limit, cursor=cursor, skip=skip)
+    content = [book_to_dict(book) for book in books]
+    if facets:
+        content = {"books": content, "facets": facet_counts(db, query, facet_limit)}
+    return content, next_cursor
+
+@router.get("/suggest", response_model=List[BookSuggestion])
+async def suggest_books(
+    q: str = Query(..., min_length=1, max_length=100, description="Partially typed title or author"),
+    limit: int = Query(10, ge=1, le=20, description="Number of suggestions to return"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Typeahead suggestions over titles and authors, tolerant of typos."""
+    # The long-lived index is built from the primary; a lagging replica would leave gaps
+    index = await ensure_suggest_index(db)
+    return index.suggest(q, limit)
+
+@router.get("/books/export")
+async def export_books(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Export format"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    is_available: Optional[bool] = Query(None, description="Filter by availability; all books when omitted"),
+    db: Session = Depends(get_db)
+):
+    """Stream the whole catalog as NDJSON or CSV."""
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_export(db.get_bind(), format, category, is_available),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'}
+    )
+
+@router.post("/books/ingest", response_model=IngestReport)
+async def ingest_books_file(
+    file: UploadFile = File(..., description="CSV or JSONL file of BookCreate records"),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$", description="Defaults to the file extension"),
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Bulk upsert books on ISBN from an uploaded feed (catalog administrators only)."""
+    input_format = format or ("csv" if (file.filename or "").endswith(".csv") else "jsonl")
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    return await run_in_threadpool(ingest_books, db.get_bind(), read_records(stream, input_format))
+
+@router.post("/books/batch", response_model=List[BookBatchItem])
+async def get_books_batch(batch: BookBatchRequest, db: AsyncSession = Depends(get_read_db)):
+    """Get many books by ID and/or ISBN in one query, in request order."""
+    normalized_isbns = {isbn: normalize_isbn(isbn) for isbn in batch.isbns}
+    wanted_isbns = [isbn for isbn in normalized_isbns.values() if isbn]
+    
+    conditions = []
+    if batch.ids:
+        conditions.append(Book.id.in_(batch.ids))
+    if wanted_isbns:
+        conditions.append(Book.isbn.in_(wanted_isbns))
+    
+    books = (await db.execute(select(Book).where(or_(*conditions)))).scalars().all() if conditions else []
+    by_id = {book.id: book for book in books}
+    by_isbn = {book.isbn: book for book in books if book.isbn}
+    
+    results = []
+    for book_id in batch.ids:
+        book = by_id.get(book_id)
+        results.append({"id": book_id, "isbn": None, "found": book is not None, "book": book and book_to_dict(book)})
+    for isbn in batch.isbns:
+        book = by_isbn.get(normalized_isbns[isbn])
+        results.append({"id": None, "isbn": isbn, "found": book is not None, "book": book and book_to_dict(book)})
+    return json_response(results)
 
 @router.get("/books/{book_id}", response_model=BookResponse)
-async def get_book(book_id: int, db: Session = Depends(get_db)):
+async def get_book(book_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
     """Get a specific book by ID."""
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
+    # Check the version first so a 304 never hydrates the full row
+    version = (await db.execute(
+        select(Book.id, Book.version, Book.updated_at, Book.created_at).where(Book.id == book_id)
+    )).first()
+    if not version:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Book not found"
         )
-    return book
+    
+    # updated_at has one-second resolution on some databases; the version counter does not
+    last_modified = version.updated_at or version.created_at
+    etag = make_etag("book", version.id, version.version)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    
+    book = await db.get(Book, book_id)
+    return json_response(book_to_dict(book), headers=cache_headers(etag, last_modified))
 
+@router.get("/books/{book_id}/download")
+async def download_book(
+    book_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Download a book file; supports Range, If-Range and If-None-Match."""
+    book = (await db.execute(
+        select(Book.book_file_url).where(Book.id == book_id, Book.is_available == True)
+    )).first()
+    path = resolve_book_file(book.book_file_url) if book else None
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book file not found"
+        )
+    
+    stat_result = path.stat()
+    etag = await run_in_threadpool(content_etag, path, stat_result)
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={settings.STATIC_CACHE_MAX_AGE_SECONDS}"}
+    if request.headers.get("if-none-match") and is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    # FileResponse streams in chunks, answers Range/If-Range against this ETag
+    # and uses zero-copy pathsend when the server offers it
+    return FileResponse(path, filename=path.name, stat_result=stat_result, headers=headers)
+
+@router.get("/books/{book_id}/also-bookmarked", response_model=List[BookResponse])
+async def get_also_bookmarked(
+    book_id: int,
+    limit: int = Query(10, ge=1, le=20, description="Number of recommendations to return"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get books most often bookmarked by readers of this book."""
+    return await _neighbor_books(db, ALSO_BOOKMARKED, book_id, limit)
+
+@router.get("/books/{book_id}/similar", response_model=List[BookResponse])
+async def get_similar_books(
+    book_id: int,
+    limit: int = Query(10, ge=1, le=20, description="Number of similar books to return"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get books with the most similar title, description, category and tags."""
+    return await _neighbor_books(db, SIMILAR, book_id, limit)
+
+@router.get("/similar/stats")
+async def get_similarity_stats():
+    """Get size, memory footprint and build times of the similar-books index."""
+    return similarity_index.stats()
+
+async def _neighbor_books(db: AsyncSession, kind: str, book_id: int, limit: int) -> Response:
+    # Neighbours are precomputed in book_neighbors; this is a primary key range scan
+    books = (await db.execute(
+        select(Book).join(BookNeighbor, BookNeighbor.neighbor_id == Book.id).where(
+            BookNeighbor.kind == kind,
+            BookNeighbor.book_id == book_id,
+            Book.is_available == True
+        ).order_by(BookNeighbor.rank).limit(limit)
+    )).scalars().all()
+    if not books and await db.get(Book, book_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Book not found"
+        )
+    return books_response(books)
+
+# The catalog cache is cleared when the primary commits, so misses refill it from the
+# primary: a lagging replica would cache pre-commit data for the whole TTL. Hits open no connection.
 @router.get("/categories")
-async def get_categories(db: Session = Depends(get_db)):
+async def get_categories(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Get list of all book categories."""
-    categories = db.query(Book.category).distinct().all()
-    return [category[0] for category in categories]
+    async def load():
+        categories = await db.execute(select(Book.category).distinct())
+        return [category[0] for category in categories]
+    return conditional_json_response(request, await catalog_cache.get_or_set_async("categories", load))
 
 @router.get("/tags")
-async def get_tags(db: Session = Depends(get_db)):
+async def get_tags(
+    with_counts: bool = Query(False, description="Include the number of books per tag"),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Get list of all book tags."""
-    # This is a simplified implementation - in production, you'd want proper tag normalization
-    books = db.query(Book.tags).filter(Book.tags.isnot(None)).all()
-    all_tags = set()
-    for book_tags in books:
-        if book_tags[0]:
-            # Assuming tags are stored as comma-separated string
-            tags = [tag.strip() for tag in book_tags[0].split(",")]
-            all_tags.update(tags)
-    
-    return list(all_tags)
+    counts = await catalog_cache.get_or_set_async("tag_counts", lambda: db.run_sync(tag_counts))
+    if with_counts:
+        return [{"tag": name, "count": count} for name, count in counts]
+    return [name for name, _ in counts]
 
-@router.get("/featured")
+@router.get("/featured", response_model=List[BookResponse])
 async def get_featured_books(
     limit: int = Query(5, ge=1, le=20, description="Number of featured books to return"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get featured books (newest books)."""
-    books = db.query(Book).filter(Book.is_available == True).order_by(Book.created_at.desc()).limit(limit).all()
-    return books
+    async def load():
+        books = (await db.execute(
+            select(Book).where(Book.is_available == True).order_by(Book.created_at.desc(), Book.id.desc()).limit(limit)
+        )).scalars().all()
+        return dump_json([book_to_dict(book) for book in books])
+    # The cache holds the rendered body, so hits skip serialization entirely
+    return json_response(await catalog_cache.get_or_set_async(("featured", limit), load))
 
-@router.get("/popular")
+@router.get("/popular", response_model=List[BookResponse])
 async def get_popular_books(
     limit: int = Query(5, ge=1, le=20, description="Number of popular books to return"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get popular books (most bookmarked)."""
-    # This is a simplified implementation - in production, you'd track views/downloads
-    books = db.query(Book).filter(Book.is_available == True).limit(limit).all()
-    return books
+    books = (await db.execute(
+        select(Book).where(Book.is_available == True).order_by(
+            Book.bookmark_count.desc(), Book.id
+        ).limit(limit)
+    )).scalars().all()
+    return books_response(books)
+
+@router.get("/cache/stats")
+async def get_catalog_cache_stats():
+    """Get hit, miss and eviction counters of the catalog cache."""
+    return catalog_cache.stats()
@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 import smtplib
@@ -7,11 +8,13 @@ import json
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-from database import get_db
+from database import AsyncSessionLocal, get_async_db
 from models import User, Notification, Book
 from schemas import NotificationResponse
 from auth_utils import get_current_active_user
 from config import settings
+from pagination import SortKey, paginate_async, NEXT_CURSOR_HEADER
+from metrics import timed_task
 
 router = APIRouter()
 
@@ -40,13 +43,19 @@ async def send_email_notification(to_email: str, subject: str, body: str):
 # Notification endpoints
 @router.get("/", response_model=List[NotificationResponse])
 async def get_user_notifications(
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+    limit: int = Query(50, ge=1, le=100, description="Number of records to return"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get user's notifications."""
-    notifications = db.query(Notification).filter(
-        Notification.user_id == current_user.id
-    ).order_by(Notification.created_at.desc()).all()
+    statement = select(Notification).where(Notification.user_id == current_user.id)
+    notifications, next_cursor = await paginate_async(
+        db, statement, [SortKey(Notification.id, descending=True)], limit, cursor=cursor
+    )
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     return notifications
 
@@ -54,13 +63,13 @@ async def get_user_notifications(
 async def mark_notification_read(
     notification_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Mark a notification as read."""
-    notification = db.query(Notification).filter(
+    notification = (await db.execute(select(Notification).where(
         Notification.id == notification_id,
         Notification.user_id == current_user.id
-    ).first()
+    ))).scalar_one_or_none()
     
     if not notification:
         raise HTTPException(
@@ -70,43 +79,49 @@ async def mark_notification_read(
     
     notification.is_sent = True
     notification.sent_at = datetime.utcnow()
-    db.commit()
+    await db.commit()
     
     return {"message": "Notification marked as read"}
 
 @router.post("/subscribe/new-releases")
 async def subscribe_to_new_releases(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Subscribe user to new release notifications."""
     # Update user preferences
     current_user.email_notifications = True
-    db.commit()
+    await db.commit()
     
     return {"message": "Successfully subscribed to new release notifications"}
 
 @router.post("/unsubscribe/new-releases")
 async def unsubscribe_from_new_releases(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Unsubscribe user from new release notifications."""
     # Update user preferences
     current_user.email_notifications = False
-    db.commit()
+    await db.commit()
     
     return {"message": "Successfully unsubscribed from new release notifications"}
 
 # Background task to send notifications
-async def send_new_release_notifications(book_id: int, db: Session):
+@timed_task()
+async def send_new_release_notifications(book_id: int):
     """Send notifications about new book releases."""
-    book = db.query(Book).filter(Book.id == book_id).first()
+    # Runs after the response, when the request's session is already closed
+    async with AsyncSessionLocal() as db:
+        await _send_new_release_notifications(db, book_id)
+
+async def _send_new_release_notifications(db: AsyncSession, book_id: int):
+    book = await db.get(Book, book_id)
     if not book:
         return
     
     # Get users who want email notifications
-    users = db.query(User).filter(User.email_notifications == True).all()
+    users = (await db.execute(select(User).where(User.email_notifications == True))).scalars().all()
     
     for user in users:
         # Create notification record
@@ -138,24 +153,23 @@ async def send_new_release_notifications(book_id: int, db: Session):
             notification.is_sent = True
             notification.sent_at = datetime.utcnow()
     
-    db.commit()
+    await db.commit()
 
 # Admin endpoint to trigger new release notifications
 @router.post("/trigger/new-release/{book_id}")
 async def trigger_new_release_notification(
     book_id: int,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks
 ):
     """Trigger new release notifications for a book."""
-    background_tasks.add_task(send_new_release_notifications, book_id, db)
+    background_tasks.add_task(send_new_release_notifications, book_id)
     return {"message": "New release notifications queued"}
 
 # Replace the entire test endpoint with:
 @router.post("/test")
 async def send_test_notification(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a test email notification to the current user."""
     if not current_user.email_notifications:
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from models import User, UserProfile
 from schemas import UserUpdate, UserResponse
 from auth_utils import get_current_active_user
@@ -16,7 +16,7 @@ async def get_user_profile(current_user: User = Depends(get_current_active_user)
 async def update_user_profile(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update user profile and preferences."""
     # Update user fields
@@ -29,8 +29,8 @@ async def update_user_profile(
     if user_update.whatsapp_notifications is not None:
         current_user.whatsapp_notifications = user_update.whatsapp_notifications
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     
     return current_user
 
@@ -47,7 +47,7 @@ async def get_user_preferences(current_user: User = Depends(get_current_active_u
 async def update_user_preferences(
     preferences: dict,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update user preferences."""
     if "dark_mode" in preferences:
@@ -57,7 +57,7 @@ async def update_user_preferences(
     if "whatsapp_notifications" in preferences:
         current_user.whatsapp_notifications = preferences["whatsapp_notifications"]
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     
     return {"message": "Preferences updated successfully"}
@@ -0,0 +1,39 @@
+from pathlib import Path
+from typing import Optional
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+
+ALEMBIC_INI = Path(__file__).with_name("alembic.ini")
+
+# Search objects created by raw DDL in models.py rather than declared as tables or columns
+_UNMANAGED_NAMES = {"search_vector", "ix_books_search_vector"}
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    """Keep the full-text search objects out of autogenerate comparisons."""
+    if type_ == "table" and name.startswith("books_fts"):
+        return False
+    return name not in _UNMANAGED_NAMES
+
+def alembic_config(url: Optional[str] = None) -> Config:
+    config = Config(str(ALEMBIC_INI))
+    if url:
+        config.set_main_option("sqlalchemy.url", url)
+    return config
+
+def head_revision() -> str:
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+def check_schema_version(engine):
+    """Fail fast unless the database is migrated to the head revision.
+
+    Reads the single alembic_version row instead of reflecting every table.
+    """
+    expected = head_revision()
+    with engine.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+    if current != expected:
+        raise RuntimeError(
+            f"Database schema is at revision {current or 'none'} but this build expects {expected}; "
+            "run `alembic upgrade head`"
+        )
@@ -1,6 +1,8 @@
-from pydantic import BaseModel, EmailStr, validator
-from typing import Optional, List, Union
+from pydantic import BaseModel, EmailStr, Field, validator
+from typing import Optional, List, Union, Dict
 from datetime import datetime
+from functools import lru_cache
+import orjson
 
 # User schemas
 class UserBase(BaseModel):
@@ -33,6 +35,10 @@ class UserResponse(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -42,6 +48,15 @@ class LoginRequest(BaseModel):
     password: str
 
 # Book schemas
+@lru_cache(maxsize=4096)
+def load_tags(value: str) -> tuple:
+    """Parse a JSON Book.tags string; catalogs reuse a small set of tag lists."""
+    try:
+        tags = orjson.loads(value)
+    except orjson.JSONDecodeError:
+        return ()
+    return tuple(tags) if isinstance(tags, list) else ()
+
 class BookBase(BaseModel):
     title: str
     author: str
@@ -65,20 +80,59 @@ class BookResponse(BookBase):
     page_count: Optional[int]
     published_date: Optional[datetime]
     is_available: bool
+    bookmark_count: int = 0
     created_at: datetime
     
     @validator('tags', pre=True)
     def parse_tags(cls, v):
         if isinstance(v, str):
-            try:
-                import json
-                return json.loads(v)
-            except:
-                return []
+            return list(load_tags(v))
         return v or []
     
     class Config:
         from_attributes = True
+
+class BookSuggestion(BaseModel):
+    id: int
+    title: str
+    author: str
+
+class FacetValue(BaseModel):
+    value: Optional[str]
+    count: int
+
+class BookSearchResponse(BaseModel):
+    books: List[BookResponse]
+    facets: Dict[str, List[FacetValue]]
+
+class BookBatchRequest(BaseModel):
+    ids: List[int] = Field([], max_length=100)
+    isbns: List[str] = Field([], max_length=100)
+
+class BookBatchItem(BaseModel):
+    id: Optional[int] = None
+    isbn: Optional[str] = None
+    found: bool
+    book: Optional[BookResponse] = None
+
+# Bulk ingestion report
+class IngestError(BaseModel):
+    line: int
+    error: str
+
+class IngestReport(BaseModel):
+    rows_read: int = 0
+    rows_written: int = 0
+    rows_failed: int = 0
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+    errors: List[IngestError] = []  # First 100 failures only
+    
+    def add_error(self, line: int, error: str):
+        self.rows_failed += 1
+        if len(self.errors) < 100:
+            self.errors.append(IngestError(line=line, error=error))
+
 # User Note schemas
 class UserNoteBase(BaseModel):
     book_id: int
@@ -0,0 +1,51 @@
+import re
+from sqlalchemy import column, false, func, literal_column, or_, table
+from models import Book
+from pagination import SortKey
+
+# FTS5 external-content table maintained by the triggers in models.py
+books_fts = table("books_fts", column("rowid"))
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+def _fts5_match_expression(search: str) -> str:
+    """Turn free text into a safe FTS5 query of prefix-matched terms."""
+    return " ".join(f'"{token}"*' for token in _token_re.findall(search))
+
+def apply_substring_search(query, search: str):
+    """Filter a Book query with ILIKE over title, author and description."""
+    search_term = f"%{search}%"
+    return query.filter(
+        or_(
+            Book.title.ilike(search_term),
+            Book.author.ilike(search_term),
+            Book.description.ilike(search_term)
+        )
+    )
+
+def apply_fulltext_search(query, search: str, dialect_name: str):
+    """Filter a Book query by full-text match.
+
+    Uses the GIN-indexed tsvector column on PostgreSQL and the FTS5 table on
+    SQLite, and returns the query with the sort keys that order it by
+    relevance. Other backends fall back to substring matching in id order.
+    """
+    if dialect_name == "postgresql":
+        ts_query = func.websearch_to_tsquery("english", search)
+        search_vector = literal_column("books.search_vector")
+        rank = func.ts_rank_cd(search_vector, ts_query)
+        query = query.filter(search_vector.op("@@")(ts_query))
+        return query, [SortKey(rank, descending=True), SortKey(Book.id)]
+
+    if dialect_name == "sqlite":
+        match_expression = _fts5_match_expression(search)
+        if not match_expression:
+            return query.filter(false()), [SortKey(Book.id)]
+        # Weight title/author matches above description, like setweight() on PostgreSQL
+        rank = func.bm25(literal_column("books_fts"), 10.0, 10.0, 1.0)
+        query = query.join(books_fts, books_fts.c.rowid == Book.id).filter(
+            literal_column("books_fts").match(match_expression)
+        )
+        return query, [SortKey(rank), SortKey(Book.id)]
+
+    return apply_substring_search(query, search), [SortKey(Book.id)]
@@ -0,0 +1,41 @@
+from typing import Any, Dict, Iterable, Optional
+import orjson
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from models import Book
+from schemas import BookResponse, load_tags
+
+# BookResponse field order, so both paths render identical documents
+BOOK_FIELDS = tuple(BookResponse.model_fields)
+
+def book_to_dict(book: Book) -> Dict[str, Any]:
+    """Build the BookResponse shape straight from trusted ORM attributes.
+
+    Skips pydantic validation; tags come from the parsed-tags cache.
+    """
+    # Loaded column values sit in __dict__; the instrumented getattr is the slow path
+    loaded = book.__dict__
+    row = {field: loaded[field] if field in loaded else getattr(book, field) for field in BOOK_FIELDS}
+    tags = row["tags"]
+    row["tags"] = load_tags(tags) if isinstance(tags, str) else (tags or ())
+    if row["bookmark_count"] is None:
+        row["bookmark_count"] = 0
+    return row
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    return jsonable_encoder(value)
+
+def dump_json(content: Any) -> bytes:
+    """Serialize content with orjson; datetimes match pydantic's output."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+def json_response(content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Return pre-serialized JSON, bypassing response_model re-validation."""
+    body = content if isinstance(content, bytes) else dump_json(content)
+    return Response(body, media_type="application/json", headers=headers)
+
+def books_response(books: Iterable[Book], headers: Optional[Dict[str, str]] = None) -> Response:
+    return json_response([book_to_dict(book) for book in books], headers)
@@ -0,0 +1,407 @@
+import argparse
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Tuple
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from config import settings
+from metrics import timed_task
+from models import Book, BookNeighbor
+from recommendations import rank_within_rows, store_neighbors, top_k_per_row
+from tagging import normalize_tags
+
+logger = logging.getLogger(__name__)
+
+SIMILAR = "similar"
+
+# Book rows multiplied per step; shared terms make these products fairly dense
+DEFAULT_BLOCK_SIZE = 256
+# Terms found in more than this share of books (and in more than
+# MIN_PRUNED_DOCUMENTS books) carry little signal and densify the product
+MAX_DOCUMENT_FREQUENCY = 0.2
+MIN_PRUNED_DOCUMENTS = 100
+TITLE_WEIGHT = 2
+# Full rebuilds find candidates through each book's strongest terms only,
+# then rescore those candidates exactly; this keeps the products sparse
+QUERY_TERMS = 24
+CANDIDATES_PER_BOOK = 200
+# Incrementally added vectors are merged into the main matrix in batches
+MERGE_THRESHOLD = 1024
+
+_word_re = re.compile(r"\w+", re.UNICODE)
+STOP_WORDS = frozenset(
+    "about after all also and are but can for from has have her his how its not "
+    "one our out she that the their them they this was were what when which who "
+    "will with you your".split()
+)
+
+Document = Tuple[int, str, str, str, str]  # id, title, description, category, tags
+
+def _words(text: str) -> List[str]:
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [
+        word for word in _word_re.findall(text)
+        if len(word) > 2 and word not in STOP_WORDS and not word.isdigit()
+    ]
+
+def _terms(title: str, description: str, category: str, tags: str) -> Counter:
+    """Count the terms of one book; category and tags become prefixed terms."""
+    counts = Counter()
+    for word in _words(title):
+        counts[word] += TITLE_WEIGHT
+    counts.update(_words(description))
+    if category:
+        counts[f"category:{category.strip().lower()}"] += 1
+    for tag in normalize_tags(tags):
+        counts[f"tag:{tag}"] += 1
+    return counts
+
+def _strongest_terms(matrix: sp.csr_matrix, limit: int) -> sp.csr_matrix:
+    """Keep the limit highest-weighted terms of every row."""
+    matrix = matrix.tocoo()
+    order, ranks = rank_within_rows(matrix.row, matrix.data, matrix.col)
+    keep = order[ranks < limit]
+    return sp.csr_matrix((matrix.data[keep], (matrix.row[keep], matrix.col[keep])), shape=matrix.shape)
+
+class SimilarityIndex:
+    """L2-normalized TF-IDF vectors of every available book.
+
+    The vocabulary and IDF weights are fixed when the index is built; books
+    added afterwards are vectorized against them and appended. Edited or
+    removed books keep their old vectors until the next rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built = False
+        self._vocabulary: Dict[str, int] = {}
+        self._idf = np.empty(0, dtype=np.float32)
+        self._matrix = sp.csr_matrix((0, 0), dtype=np.float32)
+        self._book_ids = np.empty(0, dtype=np.int64)
+        self._pending: List[sp.csr_matrix] = []
+        self._pending_ids: List[int] = []
+        self._positions: Dict[int, int] = {}
+        # Score of each book's K-th stored neighbour, 0 while it has fewer
+        self._kth_scores = np.empty(0, dtype=np.float32)
+        self._vocabulary_bytes = 0
+        self.build_seconds = 0.0
+        self.neighbor_seconds = 0.0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _count_matrix(self, documents: Iterable[Document], fit: bool) -> Tuple[sp.csr_matrix, List[int]]:
+        book_ids, indices, data, indptr = [], [], [], [0]
+        vocabulary = self._vocabulary
+        for book_id, *fields in documents:
+            for term, count in _terms(*fields).items():
+                column = vocabulary.get(term)
+                if column is None:
+                    if not fit:
+                        continue
+                    column = vocabulary[term] = len(vocabulary)
+                indices.append(column)
+                data.append(count)
+            indptr.append(len(indices))
+            book_ids.append(book_id)
+        counts = sp.csr_matrix(
+            (np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+            shape=(len(book_ids), len(vocabulary))
+        )
+        return counts, book_ids
+
+    def _weight(self, counts: sp.csr_matrix) -> sp.csr_matrix:
+        """Apply sublinear TF and IDF, then scale every row to unit length."""
+        counts.data = (1 + np.log(counts.data)) * self._idf[counts.indices]
+        counts.eliminate_zeros()
+        row_of = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+        norms = np.sqrt(np.bincount(row_of, weights=counts.data ** 2, minlength=counts.shape[0]))
+        counts.data /= norms[row_of].astype(np.float32)
+        return counts
+
+    def build(self, documents: Iterable[Document]):
+        """Fit the vocabulary and IDF weights and vectorize every document."""
+        started = time.perf_counter()
+        with self._lock:
+            self._vocabulary = {}
+            counts, book_ids = self._count_matrix(documents, fit=True)
+            total = counts.shape[0]
+            frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+            idf = (np.log((1 + total) / (1 + frequency)) + 1).astype(np.float32)
+            idf[(frequency > MAX_DOCUMENT_FREQUENCY * total) & (frequency > MIN_PRUNED_DOCUMENTS)] = 0
+            self._idf = idf
+            self._matrix = self._weight(counts)
+            self._book_ids = np.array(book_ids, dtype=np.int64)
+            self._pending, self._pending_ids = [], []
+            self._positions = {book_id: position for position, book_id in enumerate(book_ids)}
+            self._kth_scores = np.zeros(total, dtype=np.float32)
+            self._vocabulary_bytes = sys.getsizeof(self._vocabulary) + sum(
+                sys.getsizeof(term) for term in self._vocabulary
+            )
+            self.built = True
+        self.build_seconds = round(time.perf_counter() - started, 3)
+
+    def neighbor_blocks(self, top_k: int, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[tuple]:
+        """Yield top-K cosine neighbours as (book_id, neighbor_id, score, rank) arrays.
+
+        A block of rows, cut down to their QUERY_TERMS strongest terms, is
+        multiplied against the whole transposed matrix to shortlist
+        CANDIDATES_PER_BOOK books per row; the shortlist is then rescored with
+        exact cosine similarity. Only one block of scores is held at once.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            self._merge_pending()
+            matrix, book_ids = self._matrix, self._book_ids
+            transposed = matrix.T.tocsr()
+            for start in range(0, matrix.shape[0], block_size):
+                block = matrix[start:start + block_size]
+                shortlist = (_strongest_terms(block, QUERY_TERMS) @ transposed).tocsr()
+                rows, columns, _, _ = top_k_per_row(shortlist, start, CANDIDATES_PER_BOOK)
+                exact = np.asarray(matrix[rows].multiply(matrix[columns]).sum(axis=1)).ravel()
+                scores = sp.csr_matrix((exact, (rows - start, columns)), shape=shortlist.shape)
+                rows, columns, values, ranks = top_k_per_row(scores, start, top_k)
+                full = ranks == top_k - 1
+                self._kth_scores[rows[full]] = values[full]
+                if len(rows):
+                    yield book_ids[rows], book_ids[columns], values, ranks
+        self.neighbor_seconds = round(time.perf_counter() - started, 3)
+
+    def load_kth_scores(self, connection: Connection, top_k: int):
+        """Read each book's K-th stored neighbour score from book_neighbors."""
+        with self._lock:
+            rows = connection.execute(
+                select(BookNeighbor.book_id, func.min(BookNeighbor.score))
+                .where(BookNeighbor.kind == SIMILAR)
+                .group_by(BookNeighbor.book_id)
+                .having(func.count() >= top_k)
+            )
+            for book_id, score in rows:
+                position = self._positions.get(book_id)
+                if position is not None:
+                    self._kth_scores[position] = score
+
+    def _merge_pending(self):
+        if self._pending:
+            self._matrix = sp.vstack([self._matrix, *self._pending], format="csr")
+            self._book_ids = np.concatenate([self._book_ids, np.array(self._pending_ids, dtype=np.int64)])
+            self._pending, self._pending_ids = [], []
+
+    def add(self, connection: Connection, documents: Iterable[Document], top_k: int) -> int:
+        """Vectorize new books, store their neighbours and update affected lists.
+
+        Existing books only gain a new neighbour when it beats their current
+        K-th score. Returns the number of books added.
+        """
+        with self._lock:
+            documents = [document for document in documents if document[0] not in self._positions]
+            if not self.built or not documents:
+                return 0
+            vectors, new_ids = self._count_matrix(documents, fit=False)
+            vectors = self._weight(vectors)
+
+            existing = len(self._positions)
+            parts = [vectors @ self._matrix.T]
+            if self._pending:
+                parts.append(vectors @ sp.vstack(self._pending, format="csr").T)
+            parts.append(vectors @ vectors.T)
+            scores = sp.hstack(parts, format="csr")
+
+            all_ids = np.concatenate([
+                self._book_ids, np.array(self._pending_ids + new_ids, dtype=np.int64)
+            ])
+            self._pending.append(vectors)
+            self._pending_ids.extend(new_ids)
+            for offset, book_id in enumerate(new_ids):
+                self._positions[book_id] = existing + offset
+            self._kth_scores = np.concatenate([self._kth_scores, np.zeros(len(new_ids), dtype=np.float32)])
+
+            # Neighbour lists of the new books; each one's own column sits at existing + row
+            rows, columns, values, ranks = top_k_per_row(scores, existing, top_k)
+            full = ranks == top_k - 1
+            self._kth_scores[rows[full]] = values[full]
+            store_neighbors(
+                connection, SIMILAR, [(all_ids[rows], all_ids[columns], values, ranks)], book_ids=new_ids
+            )
+
+            # Existing books whose K-th neighbour is beaten by a new book
+            coo = scores.tocoo()
+            beats = (coo.col < existing) & (coo.data > self._kth_scores[np.minimum(coo.col, existing - 1)])
+            candidates: Dict[int, List[Tuple[float, int]]] = {}
+            for row, column, value in zip(coo.row[beats], coo.col[beats], coo.data[beats]):
+                candidates.setdefault(int(column), []).append((float(value), new_ids[row]))
+            if candidates:
+                self._update_lists(connection, candidates, all_ids, top_k)
+
+            if len(self._pending_ids) >= MERGE_THRESHOLD:
+                self._merge_pending()
+            return len(new_ids)
+
+    def _update_lists(self, connection, candidates, all_ids, top_k):
+        affected = {int(all_ids[position]): position for position in candidates}
+        current: Dict[int, List[Tuple[float, int]]] = {book_id: [] for book_id in affected}
+        for book_id, neighbor_id, score in connection.execute(
+            select(BookNeighbor.book_id, BookNeighbor.neighbor_id, BookNeighbor.score).where(
+                BookNeighbor.kind == SIMILAR, BookNeighbor.book_id.in_(list(affected))
+            )
+        ):
+            current[book_id].append((score, neighbor_id))
+
+        sources, neighbors, values, ranks = [], [], [], []
+        for book_id, position in affected.items():
+            merged = sorted(current[book_id] + candidates[position], key=lambda entry: (-entry[0], entry[1]))[:top_k]
+            for rank, (score, neighbor_id) in enumerate(merged):
+                sources.append(book_id)
+                neighbors.append(neighbor_id)
+                values.append(score)
+                ranks.append(rank)
+            if len(merged) == top_k:
+                self._kth_scores[position] = merged[-1][0]
+        store_neighbors(
+            connection,
+            SIMILAR,
+            [(np.array(sources), np.array(neighbors), np.array(values), np.array(ranks))],
+            book_ids=list(affected)
+        )
+
+    def stats(self) -> dict:
+        # No lock: a build holds it for as long as it runs. Attributes are
+        # read once, so the figures stay consistent enough for monitoring.
+        matrix, pending = self._matrix, list(self._pending)
+        arrays = [self._idf, self._book_ids, self._kth_scores]
+        for part in (matrix, *pending):
+            arrays.extend([part.data, part.indices, part.indptr])
+        return {
+            "built": self.built,
+            "books": len(self._positions),
+            "pending_books": len(self._pending_ids),
+            "queued_updates": similarity_updates.queued(),
+            "vocabulary_size": len(self._vocabulary),
+            "nonzero_weights": matrix.nnz + sum(part.nnz for part in pending),
+            "matrix_bytes": sum(array.nbytes for array in arrays),
+            "vocabulary_bytes": self._vocabulary_bytes,
+            "build_seconds": self.build_seconds,
+            "neighbor_seconds": self.neighbor_seconds
+        }
+
+similarity_index = SimilarityIndex()
+
+class SimilarityUpdater:
+    """Adds committed books to the index on a worker thread, off the request path.
+
+    Updates go to the engine the index was loaded from. A failed update is
+    logged; the books get neighbours at the next rebuild.
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[List[Document]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.engine = None
+        self.failures = 0
+
+    def start(self, engine: Engine):
+        with self._lock:
+            self.engine = engine
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="similarity-updates", daemon=True)
+                self._thread.start()
+
+    def submit(self, documents: List[Document]):
+        self._queue.put(documents)
+
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def wait(self):
+        """Block until every submitted update has been applied."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            documents = self._queue.get()
+            try:
+                with self.engine.begin() as connection:
+                    similarity_index.add(connection, documents, settings.SIMILAR_BOOKS_TOP_K)
+            except Exception:
+                self.failures += 1
+                logger.exception("Could not add %d books to the similarity index", len(documents))
+            finally:
+                self._queue.task_done()
+
+similarity_updates = SimilarityUpdater()
+
+def _load_documents(connection: Connection) -> Iterator[Document]:
+    result = connection.execution_options(yield_per=10_000).execute(
+        select(Book.id, Book.title, Book.description, Book.category, Book.tags)
+        .where(Book.is_available == True)
+        .order_by(Book.id)
+    )
+    for row in result:
+        yield tuple(row)
+
+@timed_task()
+def load_similarity_index(engine: Engine, top_k: int = None):
+    """Vectorize the catalog so new books get neighbours incrementally."""
+    with engine.connect() as connection:
+        with similarity_index._lock:
+            similarity_index.build(_load_documents(connection))
+            similarity_index.load_kth_scores(connection, top_k or settings.SIMILAR_BOOKS_TOP_K)
+    similarity_updates.start(engine)
+
+def rebuild_similar(engine: Engine, top_k: int = None, block_size: int = DEFAULT_BLOCK_SIZE) -> dict:
+    """Rebuild the index and replace every stored "similar" neighbour."""
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        with similarity_index._lock:
+            similarity_index.build(_load_documents(connection))
+            written = store_neighbors(
+                connection,
+                SIMILAR,
+                similarity_index.neighbor_blocks(top_k or settings.SIMILAR_BOOKS_TOP_K, block_size)
+            )
+    similarity_updates.start(engine)
+    return {
+        **similarity_index.stats(),
+        "neighbors_written": written,
+        "total_seconds": round(time.perf_counter() - started, 3)
+    }
+
+@event.listens_for(Session, "after_flush")
+def _track_new_books(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Book) and obj.is_available is not False:
+            session.info.setdefault("similarity_new", []).append(
+                (obj.id, obj.title, obj.description, obj.category, obj.tags)
+            )
+
+@event.listens_for(Session, "after_commit")
+def _add_new_books(session):
+    documents = session.info.pop("similarity_new", None)
+    if documents and similarity_index.built:
+        similarity_updates.submit(documents)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_new_books(session):
+    session.info.pop("similarity_new", None)
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Rebuild content-based similar-book neighbours.")
+    parser.add_argument("--top-k", type=int, default=settings.SIMILAR_BOOKS_TOP_K)
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    args = parser.parse_args()
+    print(rebuild_similar(engine, args.top_k, args.block_size))
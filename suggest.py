@@ -0,0 +1,279 @@
+import asyncio
+import heapq
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import islice
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database import AsyncSessionLocal
+from models import Book
+
+_word_re = re.compile(r"\w+", re.UNICODE)
+
+# Limits that keep a lookup bounded regardless of catalog size
+MAX_PREFIX_EXPANSIONS = 64
+MAX_FUZZY_CANDIDATES = 50
+MAX_FUZZY_EXPANSIONS = 16
+MAX_TERM_CANDIDATES = 2000
+TITLE_BONUS = 0.25
+
+def _words(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return _word_re.findall(text)
+
+def _trigrams(word: str) -> Set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _prefix_edit_distance(term: str, word: str, max_distance: int) -> int:
+    """Smallest optimal-string-alignment distance from term to a prefix of word.
+
+    Returns max_distance + 1 as soon as no alignment can stay within bounds.
+    """
+    word = word[:len(term) + max_distance]
+    previous2 = None
+    previous = list(range(len(word) + 1))
+    for i in range(1, len(term) + 1):
+        current = [i] + [0] * len(word)
+        for j in range(1, len(word) + 1):
+            cost = 0 if term[i - 1] == word[j - 1] else 1
+            best = previous[j - 1] + cost
+            if previous[j] + 1 < best:
+                best = previous[j] + 1
+            if current[j - 1] + 1 < best:
+                best = current[j - 1] + 1
+            if i > 1 and j > 1 and term[i - 1] == word[j - 2] and term[i - 2] == word[j - 1]:
+                if previous2[j - 2] + 1 < best:
+                    best = previous2[j - 2] + 1
+            current[j] = best
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return min(previous)
+
+class SuggestIndex:
+    """In-memory prefix and trigram index over book titles and authors.
+
+    Words map to the books containing them; a sorted vocabulary answers
+    prefix lookups with bisect and a trigram index over the vocabulary finds
+    near-miss spellings. Entries are added and removed one book at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.built = False
+        # Changes committed while a build is in flight, replayed once it swaps in
+        self._buffered: Optional[Dict[int, Optional[Tuple[str, str]]]] = None
+        self._books: Dict[int, Tuple[str, str, frozenset]] = {}  # id -> (title, author, words)
+        # word -> {book_id: static bonus for title matches and short titles}
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._vocabulary: List[str] = []
+        self._trigram_words: Dict[str, Set[str]] = defaultdict(set)
+
+    def __len__(self):
+        return len(self._books)
+
+    def start_build(self):
+        """Buffer changes from now on; call before reading the rows to build from."""
+        with self._lock:
+            self._buffered = {}
+
+    def abort_build(self):
+        with self._lock:
+            self._buffered = None
+
+    def build(self, rows):
+        """Replace the index contents with (id, title, author) rows.
+
+        The new contents are built aside and swapped in, so lookups are not
+        held up by a build. Changes buffered since start_build() are then
+        replayed, since the rows may predate them.
+        """
+        fresh = SuggestIndex()
+        for book_id, title, author in rows:
+            fresh._add(book_id, title, author)
+        with self._lock:
+            self._books = fresh._books
+            self._postings = fresh._postings
+            self._vocabulary = fresh._vocabulary
+            self._trigram_words = fresh._trigram_words
+            buffered, self._buffered = self._buffered or {}, None
+            self._apply(buffered)
+            self.built = True
+
+    def apply(self, changes: Dict[int, Optional[Tuple[str, str]]]):
+        """Apply committed changes: (title, author) upserts a book, None removes it."""
+        with self._lock:
+            if self._buffered is not None:
+                self._buffered.update(changes)
+            if self.built:
+                self._apply(changes)
+
+    def _apply(self, changes):
+        for book_id, entry in changes.items():
+            self._remove(book_id)
+            if entry is not None:
+                self._add(book_id, *entry)
+
+    def upsert(self, book_id: int, title: str, author: str):
+        with self._lock:
+            self._remove(book_id)
+            self._add(book_id, title, author)
+
+    def remove(self, book_id: int):
+        with self._lock:
+            self._remove(book_id)
+
+    def _add(self, book_id, title, author):
+        title_words = frozenset(_words(title))
+        words = title_words.union(_words(author))
+        self._books[book_id] = (title, author, words)
+        shortness = 0.001 / (1 + len(title or ""))
+        for word in words:
+            postings = self._postings[word]
+            if not postings:
+                insort(self._vocabulary, word)
+                for trigram in _trigrams(word):
+                    self._trigram_words[trigram].add(word)
+            postings[book_id] = (TITLE_BONUS if word in title_words else 0.0) + shortness
+
+    def _remove(self, book_id):
+        entry = self._books.pop(book_id, None)
+        if entry is None:
+            return
+        for word in entry[2]:
+            postings = self._postings.get(word)
+            if postings is None:
+                continue
+            postings.pop(book_id, None)
+            if not postings:
+                del self._postings[word]
+                del self._vocabulary[bisect_left(self._vocabulary, word)]
+                for trigram in _trigrams(word):
+                    self._trigram_words[trigram].discard(word)
+
+    def _expand(self, term: str) -> Dict[str, float]:
+        """Map a query term to matching vocabulary words and their weights."""
+        matches = {}
+        start = bisect_left(self._vocabulary, term)
+        for word in self._vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not word.startswith(term):
+                break
+            matches[word] = 2.0 if word == term else 1.5
+        if matches:
+            return matches
+
+        # No prefix match: words sharing the most trigrams are checked for a
+        # small edit distance against any prefix of the word
+        shared = Counter()
+        for trigram in _trigrams(term):
+            shared.update(self._trigram_words.get(trigram, ()))
+        max_distance = 1 if len(term) <= 4 else 2
+        scored = []
+        for word, _ in shared.most_common(MAX_FUZZY_CANDIDATES):
+            distance = _prefix_edit_distance(term, word, max_distance)
+            if distance <= max_distance:
+                scored.append((distance, word))
+        scored.sort()
+        return {word: 1.0 / (1 + distance) for distance, word in scored[:MAX_FUZZY_EXPANSIONS]}
+
+    def suggest(self, query: str, limit: int = 10) -> List[dict]:
+        """Return the best matches for a partially typed query.
+
+        Candidates come from the most selective term, capped at
+        MAX_TERM_CANDIDATES, and are then checked against the other terms
+        through each book's word set.
+        """
+        terms = _words(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            expansions = [self._expand(term) for term in terms]
+            if not all(expansions):
+                return []
+            expansions.sort(key=lambda expansion: sum(len(self._postings[word]) for word in expansion))
+
+            scores: Dict[int, float] = {}
+            # Best matches come first, so very short prefixes stop early; the
+            # cap also bounds a single very common word's postings
+            for word, weight in expansions[0].items():
+                remaining = MAX_TERM_CANDIDATES - len(scores)
+                if remaining <= 0:
+                    break
+                for book_id, bonus in islice(self._postings[word].items(), remaining):
+                    score = weight + bonus
+                    if score > scores.get(book_id, 0.0):
+                        scores[book_id] = score
+
+            books = self._books
+            for expansion in expansions[1:]:
+                narrowed = {}
+                for book_id, score in scores.items():
+                    weights = [expansion[word] for word in books[book_id][2] if word in expansion]
+                    if weights:
+                        narrowed[book_id] = score + max(weights)
+                scores = narrowed
+
+            ranked = heapq.nlargest(limit, scores, key=scores.get)
+            return [
+                {"id": book_id, "title": books[book_id][0], "author": books[book_id][1]}
+                for book_id in ranked
+            ]
+
+suggest_index = SuggestIndex()
+
+_build_lock = asyncio.Lock()
+
+async def ensure_suggest_index(db: AsyncSession) -> SuggestIndex:
+    """Build the index on first use; concurrent first callers share one build.
+
+    The query is awaited and the pure-Python build runs in a worker thread,
+    so the event loop keeps serving other requests meanwhile.
+    """
+    if not suggest_index.built:
+        async with _build_lock:
+            if not suggest_index.built:
+                suggest_index.start_build()
+                try:
+                    rows = (await db.execute(
+                        select(Book.id, Book.title, Book.author).where(Book.is_available == True)
+                    )).all()
+                    await asyncio.to_thread(suggest_index.build, rows)
+                except BaseException:
+                    suggest_index.abort_build()
+                    raise
+    return suggest_index
+
+async def load_suggest_index():
+    """Build the index at startup, before the first typeahead request."""
+    async with AsyncSessionLocal() as db:
+        await ensure_suggest_index(db)
+
+@event.listens_for(Session, "after_flush")
+def _track_suggest_changes(session, flush_context):
+    changes = session.info.setdefault("suggest_changes", {})
+    for obj in (*session.new, *session.dirty):
+        if isinstance(obj, Book):
+            changes[obj.id] = (obj.title, obj.author) if obj.is_available is not False else None
+    for obj in session.deleted:
+        if isinstance(obj, Book):
+            changes[obj.id] = None
+
+@event.listens_for(Session, "after_commit")
+def _apply_suggest_changes(session):
+    changes = session.info.pop("suggest_changes", None)
+    if changes:
+        suggest_index.apply(changes)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_suggest_changes(session):
+    session.info.pop("suggest_changes", None)
@@ -0,0 +1,98 @@
+import json
+from typing import Dict, List
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Book, Tag, book_tags
+
+def normalize_tags(value) -> List[str]:
+    """Parse a Book.tags value into a de-duplicated list of lower-case names."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            value = value.split(",")
+        if isinstance(value, str):
+            value = [value]
+
+    names = []
+    for tag in value:
+        name = str(tag).strip().lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def sync_book_tags(connection, book_id: int, names: List[str]):
+    """Replace the book_tags rows of a book, creating missing tags."""
+    sync_many_book_tags(connection, {book_id: names})
+
+def sync_many_book_tags(connection, tags_by_book: Dict[int, List[str]]):
+    """Replace the book_tags rows of several books with a fixed number of statements."""
+    if not tags_by_book:
+        return
+    connection.execute(book_tags.delete().where(book_tags.c.book_id.in_(list(tags_by_book))))
+
+    names = {name for book_names in tags_by_book.values() for name in book_names}
+    if not names:
+        return
+
+    tag_ids = dict(connection.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+    missing = [name for name in names if name not in tag_ids]
+    if missing:
+        connection.execute(Tag.__table__.insert(), [{"name": name} for name in missing])
+        tag_ids.update(connection.execute(select(Tag.name, Tag.id).where(Tag.name.in_(missing))).all())
+
+    connection.execute(
+        book_tags.insert(),
+        [
+            {"book_id": book_id, "tag_id": tag_ids[name]}
+            for book_id, book_names in tags_by_book.items()
+            for name in book_names
+        ]
+    )
+
+def filter_by_tags(query, names: List[str], match_all: bool = True):
+    """Restrict a Book query to books carrying all (or any) of the given tags."""
+    matching = select(book_tags.c.book_id).join(
+        Tag, Tag.id == book_tags.c.tag_id
+    ).where(Tag.name.in_(names))
+    if match_all:
+        matching = matching.group_by(book_tags.c.book_id).having(
+            func.count(book_tags.c.tag_id) == len(names)
+        )
+    return query.filter(Book.id.in_(matching))
+
+def tag_counts(db: Session):
+    """Return (name, number of available books) for every tag in use."""
+    return db.query(Tag.name, func.count(book_tags.c.book_id)).join(
+        book_tags, book_tags.c.tag_id == Tag.id
+    ).join(
+        Book, Book.id == book_tags.c.book_id
+    ).filter(Book.is_available == True).group_by(Tag.name).order_by(Tag.name).all()
+
+def backfill_book_tags(db: Session, batch_size: int = 1000) -> int:
+    """Rebuild book_tags from the JSON tags column of every book."""
+    count = 0
+    last_id = 0
+    while True:
+        batch = db.query(Book.id, Book.tags).filter(
+            Book.id > last_id
+        ).order_by(Book.id).limit(batch_size).all()
+        if not batch:
+            break
+        sync_many_book_tags(
+            db.connection(), {book_id: normalize_tags(tags) for book_id, tags in batch}
+        )
+        db.commit()
+        count += len(batch)
+        last_id = batch[-1][0]
+    return count
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        print(f"Migrated tags for {backfill_book_tags(db)} books")
+    finally:
+        db.close()
@@ -1,11 +1,43 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+import httpx
 import pytest
 from fastapi.testclient import TestClient
+
+# The query-budget tests read the X-DB-* headers, which are off by default
+os.environ.setdefault("SQL_STATS_ENABLED", "true")
 from main import app
-from database import get_db
-from models import Base, User, Book
-from auth_utils import get_password_hash
+import database
+from database import get_async_db, get_db, get_read_db
+from models import Base, User, Book, RevokedToken
+from auth_utils import get_password_hash, pwd_context
+from popularity import reconcile_bookmark_counts
+from cache import catalog_cache, principal_cache
+from throttling import MemoryThrottleBackend, login_throttle
+from recommendations import rebuild_also_bookmarked
+from similarity import rebuild_similar, similarity_index, similarity_updates
+from suggest import SuggestIndex, suggest_index
+from serialization import book_to_dict, dump_json
+from pooling import InstrumentedQueuePool, pool_metrics
+from replicas import ReplicaRouter
+from revocation import revocation_list
+from ingest import ingest_books
+from metrics import timed_task
+from query_stats import QUERY_COUNT_HEADER, REPEATED_HEADER, count_queries
+from schema_version import alembic_config, check_schema_version, include_object
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from schemas import BookResponse
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from config import settings
 
 # Create test database
@@ -20,7 +52,16 @@ def override_get_db():
     finally:
         db.close()
 
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def override_get_async_db():
+    async with AsyncTestingSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
+app.dependency_overrides[get_read_db] = override_get_async_db
 
 client = TestClient(app)
 
@@ -66,6 +107,68 @@ def test_health_check():
     assert response.status_code == 200
     assert response.json()["status"] == "healthy"
 
+def test_health_reports_pool_metrics():
+    response = client.get("/health")
+    pools = response.json()["database_pool"]
+    assert {"checked_out", "overflow", "average_wait_ms", "timeouts"} <= set(pools["sync"])
+    assert pools["async"]["size"] == settings.DB_POOL_SIZE
+
+def test_instrumented_pool_counts_checkouts_and_timeouts(tmp_path):
+    pool_engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    with pool_engine.connect():
+        assert pool_metrics(pool_engine)["checked_out"] == 1
+        with pytest.raises(PoolTimeoutError):
+            pool_engine.connect()
+    metrics = pool_metrics(pool_engine)
+    assert metrics["checked_out"] == 0
+    assert metrics["checkouts"] == 1
+    assert metrics["timeouts"] == 1
+    pool_engine.dispose()
+
+def test_migrations_match_models(tmp_path):
+    url = f"sqlite:///{tmp_path / 'migrated.db'}"
+    migrated = create_engine(url)
+    with pytest.raises(RuntimeError, match="alembic upgrade head"):
+        check_schema_version(migrated)
+
+    command.upgrade(alembic_config(url), "head")
+    check_schema_version(migrated)
+    with migrated.connect() as connection:
+        context = MigrationContext.configure(connection, opts={"include_object": include_object})
+        assert compare_metadata(context, Base.metadata) == []
+
+    command.downgrade(alembic_config(url), "base")
+    with migrated.connect() as connection:
+        assert MigrationContext.configure(connection).get_current_revision() is None
+    migrated.dispose()
+
+def test_upgrade_from_baseline_backfills_series_objects(tmp_path):
+    url = f"sqlite:///{tmp_path / 'baseline.db'}"
+    command.upgrade(alembic_config(url), "0001")
+    baseline = create_engine(url)
+    with baseline.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO books (id, title, author, category, tags) "
+            "VALUES (1, 'Dune', 'Frank Herbert', 'Fiction', '[\"Classic\", \"space\", \"classic\"]')"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO users (id, email, username, hashed_password) VALUES (1, 'a@example.com', 'a', 'x')"
+        )
+        connection.exec_driver_sql("INSERT INTO user_bookmarks (user_id, book_id) VALUES (1, 1)")
+
+    command.upgrade(alembic_config(url), "head")
+    with baseline.connect() as connection:
+        assert connection.exec_driver_sql("SELECT bookmark_count FROM books").scalar() == 1
+        assert connection.exec_driver_sql(
+            "SELECT group_concat(name) FROM (SELECT tags.name FROM book_tags JOIN tags ON tags.id = book_tags.tag_id "
+            "ORDER BY tags.name)"
+        ).scalar() == "classic,space"
+        assert connection.exec_driver_sql("SELECT rowid FROM books_fts WHERE books_fts MATCH 'herbert'").scalar() == 1
+    baseline.dispose()
+
 def test_user_registration(test_user, setup_database):
     response = client.post("/api/auth/register", json=test_user)
     assert response.status_code == 200
@@ -147,5 +250,678 @@ def test_unauthorized_access():
     response = client.get("/api/users/profile")
     assert response.status_code == 401
 
+@pytest.fixture(scope="module")
+def sample_books(setup_database):
+    db = TestingSessionLocal()
+    books = [
+        Book(title="Python Programming", author="Mark Lutz", category="Programming",
+             description="Comprehensive guide to the Python language.",
+             tags=json.dumps(["programming", "python"]), isbn="9781449355739"),
+        Book(title="Clean Code", author="Robert C. Martin", category="Programming",
+             description="A handbook of agile software craftsmanship with Python examples.",
+             tags=json.dumps(["programming", "software"]), isbn="9780132350884"),
+        Book(title="The Art of War", author="Sun Tzu", category="Philosophy",
+             description="Ancient Chinese military treatise.",
+             tags=json.dumps(["philosophy", "strategy"]), isbn="9781590309637"),
+        Book(title="Smart Money", author="Jane Doe", category="Finance",
+             description="Investing for beginners.",
+             tags=json.dumps(["smart", "finance"]), isbn="9780000000002"),
+    ]
+    db.add_all(books)
+    db.commit()
+    ids = {book.title: book.id for book in books}
+    db.close()
+    return ids
+
+def test_fulltext_search_ranks_matches(sample_books):
+    response = client.get("/api/library/books", params={"search": "python"})
+    assert response.status_code == 200
+    titles = [book["title"] for book in response.json()]
+    assert titles == ["Python Programming", "Clean Code"]
+
+def test_fulltext_search_applies_filters(sample_books):
+    response = client.get("/api/library/books", params={"search": "progr", "category": "Philosophy"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+    response = client.get("/api/library/books", params={"search": "treatise", "limit": 1})
+    assert [book["title"] for book in response.json()] == ["The Art of War"]
+
+def test_substring_search_mode(sample_books):
+    response = client.get("/api/library/books", params={"search": "atise", "search_mode": "substring"})
+    assert response.status_code == 200
+    assert [book["title"] for book in response.json()] == ["The Art of War"]
+
+def login_headers(username):
+    user = {"email": f"{username}@example.com", "username": username, "password": "password123"}
+    client.post("/api/auth/register", json=user)
+    response = client.post("/api/auth/login", json={"username": username, "password": "password123"})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def assert_query_budget(response, max_queries):
+    """Fail if a request ran more statements than budgeted or repeated one (probable N+1)."""
+    assert response.status_code < 500
+    queries = int(response.headers[QUERY_COUNT_HEADER])
+    assert queries <= max_queries, f"{queries} statements, budget is {max_queries}"
+    assert REPEATED_HEADER not in response.headers
+
+def test_books_cursor_pagination(sample_books):
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/library/books", params=params)
+        assert response.status_code == 200
+        seen.extend(book["id"] for book in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == sorted(sample_books.values())
+
+def test_search_cursor_pagination(sample_books):
+    first = client.get("/api/library/books", params={"search": "python", "limit": 1})
+    cursor = first.headers["X-Next-Cursor"]
+    second = client.get("/api/library/books", params={"search": "python", "limit": 1, "cursor": cursor})
+    assert [book["title"] for book in first.json() + second.json()] == ["Python Programming", "Clean Code"]
+    assert "X-Next-Cursor" not in second.headers
+
+def test_invalid_cursor_rejected():
+    response = client.get("/api/library/books", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_notes_cursor_pagination(sample_books):
+    headers = login_headers("noteuser")
+    book_id = sample_books["Clean Code"]
+    for i in range(3):
+        client.post("/api/bookmarks/notes", json={"book_id": book_id, "note_text": f"note {i}"}, headers=headers)
+
+    first = client.get("/api/bookmarks/notes", params={"limit": 2}, headers=headers)
+    assert [note["note_text"] for note in first.json()] == ["note 2", "note 1"]
+    second = client.get(
+        "/api/bookmarks/notes",
+        params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]},
+        headers=headers
+    )
+    assert [note["note_text"] for note in second.json()] == ["note 0"]
+
+def test_tag_filter_matches_whole_tags(sample_books):
+    response = client.get("/api/library/books", params={"tags": "art"})
+    assert response.json() == []
+
+    response = client.get("/api/library/books", params={"tags": "Programming,python"})
+    assert [book["title"] for book in response.json()] == ["Python Programming"]
+
+    response = client.get("/api/library/books", params={"tags": "python,software", "tag_match": "any"})
+    assert [book["title"] for book in response.json()] == ["Python Programming", "Clean Code"]
+
+def test_get_tags_with_counts(sample_books):
+    response = client.get("/api/library/tags", params={"with_counts": True})
+    assert response.status_code == 200
+    counts = {entry["tag"]: entry["count"] for entry in response.json()}
+    assert counts["programming"] == 2
+    assert counts["smart"] == 1
+
+def test_catalog_cache_invalidated_on_book_write(sample_books):
+    client.get("/api/library/categories")
+    hits_before = client.get("/api/library/cache/stats").json()["hits"]
+    assert "Poetry" not in client.get("/api/library/categories").json()
+    assert client.get("/api/library/cache/stats").json()["hits"] == hits_before + 1
+
+    db = TestingSessionLocal()
+    book = Book(title="Leaves of Grass", author="Walt Whitman", category="Poetry")
+    db.add(book)
+    db.commit()
+    assert "Poetry" in client.get("/api/library/categories").json()
+    assert client.get("/api/library/featured", params={"limit": 1}).json()[0]["title"] == "Leaves of Grass"
+
+    book.is_available = False
+    db.commit()
+    db.close()
+    featured = client.get("/api/library/featured", params={"limit": 1}).json()
+    assert featured[0]["title"] != "Leaves of Grass"
+
+def test_popular_books_follow_bookmark_counts(sample_books):
+    art_of_war = sample_books["The Art of War"]
+    for username in ("reader1", "reader2"):
+        headers = login_headers(username)
+        assert client.post(f"/api/bookmarks/{art_of_war}", headers=headers).status_code == 200
+    client.post(f"/api/bookmarks/{sample_books['Clean Code']}", headers=headers)
+
+    popular = client.get("/api/library/popular", params={"limit": 2}).json()
+    assert [(book["id"], book["bookmark_count"]) for book in popular] == [
+        (art_of_war, 2), (sample_books["Clean Code"], 1)
+    ]
+
+    def featured_count():
+        featured = client.get("/api/library/featured", params={"limit": 20}).json()
+        return next(book["bookmark_count"] for book in featured if book["id"] == art_of_war)
+
+    assert featured_count() == 2
+    client.get("/api/library/categories")
+    assert client.delete(f"/api/bookmarks/{art_of_war}", headers=headers).status_code == 200
+    # A repeated remove matches no row and must not decrement again
+    assert client.delete(f"/api/bookmarks/{art_of_war}", headers=headers).status_code == 404
+    assert client.get(f"/api/library/books/{art_of_war}").json()["bookmark_count"] == 1
+    assert featured_count() == 1
+    # Bookmarks only drop the featured lists; categories stay cached
+    hits_before = client.get("/api/library/cache/stats").json()["hits"]
+    client.get("/api/library/categories")
+    assert client.get("/api/library/cache/stats").json()["hits"] == hits_before + 1
+
+def test_reconcile_bookmark_counts(sample_books):
+    db = TestingSessionLocal()
+    book = db.get(Book, sample_books["Smart Money"])
+    book.bookmark_count = 42
+    db.commit()
+    assert reconcile_bookmark_counts(db) >= 1
+    db.refresh(book)
+    assert book.bookmark_count == 0
+    db.close()
+
+def test_also_bookmarked_recommendations(sample_books):
+    python_id, clean_code, art_of_war = (
+        sample_books["Python Programming"], sample_books["Clean Code"], sample_books["The Art of War"]
+    )
+    for username, book_ids in [
+        ("recommend1", [python_id, clean_code]),
+        ("recommend2", [python_id, clean_code]),
+        ("recommend3", [python_id, art_of_war]),
+    ]:
+        headers = login_headers(username)
+        for book_id in book_ids:
+            client.post(f"/api/bookmarks/{book_id}", headers=headers)
+
+    stats = rebuild_also_bookmarked(engine, top_k=5)
+    assert stats["neighbors_written"] > 0
+
+    response = client.get(f"/api/library/books/{python_id}/also-bookmarked")
+    assert response.status_code == 200
+    ids = [book["id"] for book in response.json()]
+    assert ids[:2] == [clean_code, art_of_war]
+    assert python_id not in ids
+
+    response = client.get(f"/api/library/books/{python_id}/also-bookmarked", params={"limit": 1})
+    assert [book["id"] for book in response.json()] == [clean_code]
+    assert client.get("/api/library/books/999999/also-bookmarked").status_code == 404
+
+def test_direct_serialization_matches_response_model(sample_books):
+    db = TestingSessionLocal()
+    book = db.get(Book, sample_books["Python Programming"])
+    assert json.loads(dump_json(book_to_dict(book))) == json.loads(BookResponse.model_validate(book).model_dump_json())
+    db.close()
+
+    response = client.get("/api/library/books", params={"search": "python", "search_mode": "substring"})
+    assert response.json()[0]["tags"] == ["programming", "python"]
+
+def test_principal_cache_invalidated_on_user_changes(setup_database):
+    headers = login_headers("cached_principal")
+    assert client.get("/api/users/preferences", headers=headers).status_code == 200
+    hits = principal_cache.hits
+    assert client.get("/api/users/preferences", headers=headers).json()["dark_mode"] is False
+    assert principal_cache.hits == hits + 1
+
+    client.put("/api/users/preferences", json={"dark_mode": True}, headers=headers)
+    assert client.get("/api/users/preferences", headers=headers).json()["dark_mode"] is True
+    client.post("/api/notifications/unsubscribe/new-releases", headers=headers)
+    assert client.get("/api/users/preferences", headers=headers).json()["email_notifications"] is False
+
+    db = TestingSessionLocal()
+    db.query(User).filter(User.username == "cached_principal").first().is_active = False
+    db.commit()
+    db.close()
+    assert client.get("/api/users/preferences", headers=headers).status_code == 400
+    assert client.get("/api/auth/cache/stats").json()["hits"] >= 1
+
+def test_login_upgrades_outdated_password_hash(setup_database):
+    db = TestingSessionLocal()
+    db.add(User(email="legacy@example.com", username="legacy_hash",
+                hashed_password=pwd_context.handler("bcrypt").using(rounds=4).hash("password123")))
+    db.commit()
+    db.close()
+
+    response = client.post("/api/auth/login", json={"username": "legacy_hash", "password": "password123"})
+    assert response.status_code == 200
+    db = TestingSessionLocal()
+    upgraded = db.query(User).filter(User.username == "legacy_hash").first().hashed_password
+    db.close()
+    assert not pwd_context.needs_update(upgraded)
+    assert pwd_context.verify("password123", upgraded)
+
+    stats = client.get("/api/auth/hashing/stats").json()
+    assert stats["completed"] >= 1 and stats["in_flight"] == 0
+
+def test_login_throttled_per_username(setup_database, monkeypatch):
+    monkeypatch.setattr(login_throttle, "backend", MemoryThrottleBackend(maxsize=100))
+    monkeypatch.setattr(login_throttle, "username_limit", 3)
+    login_headers("throttled")
+    bad_login = {"username": "throttled", "password": "wrong"}
+    for _ in range(3):
+        assert client.post("/api/auth/login", json=bad_login).status_code == 401
+    response = client.post("/api/auth/login", json=bad_login)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 0
+
+    # Other usernames are unaffected; the throttled one is refused before verification
+    login_headers("not_throttled")
+    assert client.post("/api/auth/login", json={**bad_login, "password": "password123"}).status_code == 429
+
+def test_memory_throttle_backend_evicts_oldest_keys():
+    backend = MemoryThrottleBackend(maxsize=2)
+    for key in ("a", "b", "c"):
+        assert asyncio.run(backend.hit(key, limit=1, window=60)) == 0
+    assert len(backend) == 2 and backend.evictions == 1
+    assert asyncio.run(backend.hit("c", limit=1, window=60)) > 0
+
+def test_refresh_token_rotation_and_logout(setup_database):
+    login_headers("rotating")
+    tokens = client.post("/api/auth/login", json={"username": "rotating", "password": "password123"}).json()
+    refresh_token = tokens["refresh_token"]
+
+    # Refresh tokens cannot be used as access tokens
+    assert client.get("/api/users/preferences", headers={"Authorization": f"Bearer {refresh_token}"}).status_code == 401
+
+    rotated = client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+    assert rotated.status_code == 200
+    assert client.post("/api/auth/refresh", json={"refresh_token": refresh_token}).status_code == 401
+
+    tokens = rotated.json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/api/users/preferences", headers=headers).status_code == 200
+    response = client.post("/api/auth/logout", json={"refresh_token": tokens["refresh_token"]}, headers=headers)
+    assert response.status_code == 200
+    assert client.get("/api/users/preferences", headers=headers).status_code == 401
+    assert client.post("/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}).status_code == 401
+    assert client.get("/api/auth/revocation/stats").json()["confirmed_revocations"] >= 1
+
+def test_get_book_conditional_requests(sample_books):
+    url = f"/api/library/books/{sample_books['The Art of War']}"
+    response = client.get(url)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert "max-age" in response.headers["Cache-Control"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(url, headers={"If-Modified-Since": response.headers["Last-Modified"]})
+    assert response.status_code == 304
+
+    assert client.get(url, headers={"If-None-Match": '"stale"'}).status_code == 200
+
+    # A 304 is answered from the version columns without loading the full row
+    async def conditional_get():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await async_client.get(url, headers={"If-None-Match": etag})
+
+    with count_queries() as stats:
+        assert asyncio.run(conditional_get()).status_code == 304
+    assert stats.count == 1
+    assert not any("books.description" in statement for statement in stats.statements)
+
+    # An edit within the same second as the last one still changes the ETag
+    db = TestingSessionLocal()
+    book = db.get(Book, sample_books["The Art of War"])
+    book.description = "Revised edition"
+    db.commit()
+    db.close()
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+def test_list_endpoints_return_content_etags(sample_books):
+    for url in ("/api/library/books", "/api/library/categories", "/api/interactions/surveys", "/api/interactions/faq"):
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+        assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    first = client.get("/api/library/books", params={"limit": 1})
+    second = client.get("/api/library/books", params={"limit": 2})
+    assert first.headers["ETag"] != second.headers["ETag"]
+
+def test_get_books_batch_by_ids_and_isbns(sample_books):
+    response = client.post("/api/library/books/batch", json={
+        "ids": [sample_books["Clean Code"], 999999, sample_books["Smart Money"]],
+        "isbns": ["978-1-59030-963-7", "0-13-235088-2", "not-an-isbn"]
+    })
+    assert response.status_code == 200
+    results = response.json()
+    assert [item["found"] for item in results] == [True, False, True, True, True, False]
+    assert results[0]["book"]["title"] == "Clean Code"
+    assert results[1] == {"id": 999999, "isbn": None, "found": False, "book": None}
+    assert results[3]["book"]["title"] == "The Art of War"
+    assert results[4]["isbn"] == "0-13-235088-2"
+    assert results[4]["book"]["title"] == "Clean Code"
+
+def test_get_books_batch_size_limit():
+    response = client.post("/api/library/books/batch", json={"ids": list(range(101))})
+    assert response.status_code == 422
+
+def test_get_books_with_facets(sample_books):
+    response = client.get("/api/library/books", params={"search": "python", "facets": True, "limit": 1})
+    assert response.status_code == 200
+    data = response.json()
+    assert [book["title"] for book in data["books"]] == ["Python Programming"]
+    assert data["facets"]["category"] == [{"value": "Programming", "count": 2}]
+    assert data["facets"]["language"] == [{"value": "English", "count": 2}]
+    assert data["facets"]["tag"][0] == {"value": "programming", "count": 2}
+    assert len(data["facets"]["tag"]) == 3
+
+    response = client.get("/api/library/books", params={"search": "python", "facets": True, "facet_limit": 1})
+    assert len(response.json()["facets"]["tag"]) == 1
+
+def test_suggest_prefix_and_typos(sample_books):
+    response = client.get("/api/library/suggest", params={"q": "cle"})
+    assert response.status_code == 200
+    assert response.json()[0]["title"] == "Clean Code"
+
+    response = client.get("/api/library/suggest", params={"q": "pyhton"})
+    assert [item["title"] for item in response.json()] == ["Python Programming"]
+
+    response = client.get("/api/library/suggest", params={"q": "robert mar"})
+    assert [item["title"] for item in response.json()] == ["Clean Code"]
+
+def test_suggest_index_follows_book_changes(sample_books):
+    client.get("/api/library/suggest", params={"q": "x"})
+    db = TestingSessionLocal()
+    book = Book(title="Zen and the Art of Motorcycle Maintenance", author="Robert Pirsig", category="Philosophy")
+    db.add(book)
+    db.commit()
+    assert client.get("/api/library/suggest", params={"q": "motorc"}).json()[0]["id"] == book.id
+
+    book.is_available = False
+    db.commit()
+    db.close()
+    assert client.get("/api/library/suggest", params={"q": "motorc"}).json() == []
+
+def test_suggest_changes_during_build_are_replayed():
+    index = SuggestIndex()
+    index.start_build()
+    rows = [(1, "Clean Code", "Robert Martin"), (2, "Dune", "Frank Herbert")]
+    # Committed after the rows were read, before the build swaps in
+    index.apply({3: ("Cleanroom Software", "Harlan Mills"), 2: None})
+    index.build(rows)
+    assert [match["id"] for match in index.suggest("clean")] == [1, 3]
+    assert index.suggest("dune") == []
+
+def test_concurrent_first_suggest_requests_share_one_build(sample_books, monkeypatch):
+    builds = []
+    build = suggest_index.build
+    monkeypatch.setattr(suggest_index, "built", False)
+    monkeypatch.setattr(suggest_index, "build", lambda rows: builds.append(len(rows)) or build(rows))
+
+    async def fetch_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            return await asyncio.gather(*(
+                async_client.get("/api/library/suggest", params={"q": "cle"}) for _ in range(5)
+            ))
+
+    responses = asyncio.run(fetch_all())
+    assert len(builds) == 1
+    assert all(response.json()[0]["title"] == "Clean Code" for response in responses)
+
+def test_export_books_ndjson_and_csv(sample_books):
+    response = client.get("/api/library/books/export", params={"category": "Programming"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert [record["title"] for record in records] == ["Python Programming", "Clean Code"]
+    assert records[0]["tags"] == ["programming", "python"]
+
+    response = client.get("/api/library/books/export", params={"format": "csv", "category": "Programming"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["isbn"] for row in rows] == ["9781449355739", "9780132350884"]
+    assert rows[1]["tags"] == "programming|software"
+
+def test_ingest_books_upserts_on_isbn(sample_books, monkeypatch):
+    headers = login_headers("ingestuser")
+    forbidden = client.post(
+        "/api/library/books/ingest", files={"file": ("feed.jsonl", b"", "application/x-ndjson")}, headers=headers
+    )
+    assert forbidden.status_code == 403
+    monkeypatch.setattr(settings, "CATALOG_ADMIN_USERNAMES", ["ingestuser"])
+    feed = "\n".join([
+        json.dumps({"title": "Clean Code (2nd ed.)", "author": "Robert C. Martin", "category": "Programming",
+                    "isbn": "978-0-13-235088-4", "tags": ["programming", "refactoring"]}),
+        json.dumps({"title": "Dune", "author": "Frank Herbert", "category": "Science Fiction", "isbn": "0-441-17271-7"}),
+        json.dumps({"title": "Missing author", "category": "Fiction"}),
+        "not json",
+    ])
+    response = client.post(
+        "/api/library/books/ingest",
+        files={"file": ("feed.jsonl", feed.encode(), "application/x-ndjson")},
+        headers=headers
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["rows_read"], report["rows_written"], report["rows_failed"]) == (4, 2, 2)
+    assert [error["line"] for error in report["errors"]] == [3, 4]
+
+    book = client.get(f"/api/library/books/{sample_books['Clean Code']}").json()
+    assert book["title"] == "Clean Code (2nd ed.)"
+    assert book["tags"] == ["programming", "refactoring"]
+    assert client.get("/api/library/books", params={"tags": "refactoring"}).json()[0]["id"] == sample_books["Clean Code"]
+
+    csv_feed = "title,author,category,isbn,tags\nDune Messiah,Frank Herbert,Science Fiction,9780441172696,classic|sequel\n"
+    response = client.post(
+        "/api/library/books/ingest",
+        files={"file": ("feed.csv", csv_feed.encode(), "text/csv")},
+        headers=headers
+    )
+    assert response.json()["rows_written"] == 1
+    assert client.get("/api/library/books", params={"tags": "sequel"}).json()[0]["title"] == "Dune Messiah"
+
+def test_ingest_reports_duplicates_and_keeps_good_rows(setup_database, monkeypatch):
+    # New books reach the similarity index through the updater queue, never inline
+    submitted = []
+    monkeypatch.setattr(similarity_index, "built", True)
+    monkeypatch.setattr(similarity_updates, "submit", submitted.append)
+    feed = [
+        (1, {"title": "First", "author": "A", "category": "Fiction", "isbn": "9780306406157"}),
+        (2, {"title": "Second", "author": "B", "category": "Fiction", "isbn": "9780306406157"}),
+        (3, {"title": "Good", "author": "C", "category": "Fiction"}),
+        # Passes validation but overflows the INTEGER column, failing the chunk's first attempt
+        (4, {"title": "Bad", "author": "D", "category": "Fiction", "file_size": 2 ** 70}),
+    ]
+    report = ingest_books(engine, ((line, record, None) for line, record in feed))
+    assert (report.rows_read, report.rows_written, report.rows_failed) == (4, 2, 2)
+    assert [error.line for error in report.errors] == [1, 4]
+    assert "superseded by line 2" in report.errors[0].error
+    assert sorted(document[1] for batch in submitted for document in batch) == ["Good", "Second"]
+
+def test_download_book_supports_ranges(sample_books, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BOOK_FILES_DIR", str(tmp_path))
+    (tmp_path / "art-of-war.epub").write_bytes(bytes(range(256)) * 4)
+    db = TestingSessionLocal()
+    book = db.get(Book, sample_books["The Art of War"])
+    book.book_file_url = "art-of-war.epub"
+    db.commit()
+    db.close()
+
+    headers = login_headers("downloader")
+    url = f"/api/library/books/{sample_books['The Art of War']}/download"
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert len(response.content) == 1024
+    etag = response.headers["ETag"]
+
+    response = client.get(url, headers={**headers, "Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == bytes(range(10, 20))
+    assert response.headers["Content-Range"] == "bytes 10-19/1024"
+
+    response = client.get(url, headers={**headers, "Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    response = client.get(url, headers={**headers, "Range": "bytes=10-19", "If-Range": etag})
+    assert response.status_code == 206
+
+    assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+
+def test_download_rejects_paths_outside_storage(sample_books, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "BOOK_FILES_DIR", str(tmp_path / "files"))
+    (tmp_path / "secret.txt").write_text("secret")
+    db = TestingSessionLocal()
+    book = db.get(Book, sample_books["Smart Money"])
+    book.book_file_url = "../secret.txt"
+    db.commit()
+    db.close()
+
+    url = f"/api/library/books/{sample_books['Smart Money']}/download"
+    assert client.get(url, headers=login_headers("downloader")).status_code == 404
+
+def test_endpoint_query_budgets(sample_books, monkeypatch):
+    headers = login_headers("budgeted")
+    book_id = sample_books["Clean Code"]
+    # Warm the principal cache and revocation filter, and keep the filter from re-syncing mid-test
+    client.get("/api/users/preferences", headers=headers)
+    monkeypatch.setattr(revocation_list, "sync_seconds", float("inf"))
+    # Book lookup, existence check, insert, counter update (the user comes from the principal cache)
+    assert_query_budget(client.post(f"/api/bookmarks/{book_id}", headers=headers), 4)
+    assert_query_budget(client.get("/api/bookmarks/", headers=headers), 1)
+    assert_query_budget(client.get("/api/library/books", params={"facets": True}), 3)
+    assert_query_budget(client.get(f"/api/library/books/{book_id}"), 2)
+    assert_query_budget(client.delete(f"/api/bookmarks/{book_id}", headers=headers), 2)
+
+def test_concurrent_requests_do_not_block_on_revocation_sync(setup_database, monkeypatch):
+    headers = login_headers("concurrent")
+    # Every request re-syncs the revocation filter, so they all contend for it
+    monkeypatch.setattr(revocation_list, "sync_seconds", 0)
+    statuses = []
+
+    async def fetch_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as async_client:
+            responses = await asyncio.gather(*(async_client.get("/api/auth/me", headers=headers) for _ in range(10)))
+        statuses.extend(response.status_code for response in responses)
+
+    worker = threading.Thread(target=asyncio.run, args=(fetch_all(),), daemon=True)
+    worker.start()
+    worker.join(timeout=30)
+    assert not worker.is_alive(), "concurrent requests deadlocked"
+    assert statuses == [200] * 10
+
+def test_revocation_sync_picks_up_out_of_order_commits(setup_database, monkeypatch):
+    monkeypatch.setattr(revocation_list, "sync_seconds", 0)
+    monkeypatch.setattr(revocation_list, "_watermark", None)
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+    db = TestingSessionLocal()
+    try:
+        db.add(RevokedToken(id=50, jti="later", expires_at=expires_at))
+        db.commit()
+        assert revocation_list.is_revoked("later", db)
+        # Another worker's revocation drew a lower id but committed after the sync
+        db.add(RevokedToken(id=40, jti="earlier", expires_at=expires_at))
+        db.commit()
+        assert revocation_list.is_revoked("earlier", db)
+    finally:
+        db.close()
+
+def test_repeated_statements_flagged(sample_books):
+    db = TestingSessionLocal()
+    with count_queries() as stats:
+        for book_id in sample_books.values():
+            db.get(Book, book_id)
+    db.close()
+    assert stats.count == len(sample_books)
+    assert list(stats.repeated(threshold=len(sample_books)).values()) == [len(sample_books)]
+    assert stats.repeated(threshold=len(sample_books) + 1) == {}
+
+def test_read_replica_routing(setup_database, tmp_path, monkeypatch):
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica_engine = create_engine(replica_url)
+    Base.metadata.create_all(bind=replica_engine)
+    with replica_engine.begin() as connection:
+        connection.execute(Book.__table__.insert().values(id=9001, title="Replica Only", author="R. Eplica", category="Replicated"))
+    replica_engine.dispose()
+
+    router = ReplicaRouter([replica_url, f"sqlite:///{tmp_path / 'missing' / 'down.db'}"], 60, 1)
+    asyncio.run(router.check())
+    assert [replica.healthy for replica in router.replicas] == [True, False]
+    assert {router.choose() for _ in range(4)} == {router.replicas[0]}
+
+    monkeypatch.setattr(database, "replica_router", router)
+    monkeypatch.delitem(app.dependency_overrides, get_read_db)
+    try:
+        response = client.get("/api/library/books/9001")
+        assert response.status_code == 200
+        assert response.json()["title"] == "Replica Only"
+        # Writes stay on the primary, which has no such book
+        response = client.post("/api/bookmarks/9001", headers=login_headers("replica_reader"))
+        assert response.status_code == 404
+        # Cached catalog metadata is refilled from the primary, never from a (possibly lagging) replica
+        catalog_cache.clear()
+        assert "Replicated" not in client.get("/api/library/categories").json()
+    finally:
+        asyncio.run(router.dispose())
+
+def test_similar_books_and_incremental_updates(sample_books, monkeypatch):
+    python_id = sample_books["Python Programming"]
+    stats = rebuild_similar(engine, top_k=5)
+    assert stats["books"] > 0 and stats["neighbors_written"] > 0
+    assert stats["matrix_bytes"] > 0
+
+    response = client.get(f"/api/library/books/{python_id}/similar")
+    assert response.status_code == 200
+    ids = [book["id"] for book in response.json()]
+    assert ids[0] == sample_books["Clean Code"]
+    assert python_id not in ids
+
+    db = TestingSessionLocal()
+    book = Book(title="Learning Python", author="Mark Lutz", category="Programming",
+                description="An introduction to the Python language.", tags=json.dumps(["python"]))
+    db.add(book)
+    db.commit()
+    new_id = book.id
+    # New books are indexed by a worker thread after the commit
+    similarity_updates.wait()
+
+    similar = [book["id"] for book in client.get(f"/api/library/books/{new_id}/similar").json()]
+    assert similar[0] == python_id
+    similar = [book["id"] for book in client.get(f"/api/library/books/{python_id}/similar").json()]
+    assert new_id in similar
+    assert client.get("/api/library/similar/stats").json()["pending_books"] == 1
+    assert client.get("/api/library/books/999999/similar").status_code == 404
+
+    # A failing index update is logged and never fails the committed write
+    def fail(*args):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(similarity_index, "add", fail)
+    failures = similarity_updates.failures
+    db.add(Book(title="Fluent Python", author="Luciano Ramalho", category="Programming"))
+    db.commit()
+    db.close()
+    similarity_updates.wait()
+    assert similarity_updates.failures == failures + 1
+    similarity_index.built = False
+
+def test_metrics_endpoint_labels_route_templates(sample_books):
+    book_id = sample_books["Clean Code"]
+    client.get(f"/api/library/books/{book_id}")
+    client.get("/api/library/books/999999")
+    client.get("/no/such/path")
+
+    @timed_task("metrics_test_task")
+    def failing_task():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        failing_task()
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'http_requests_total{method="GET",route="/api/library/books/{book_id}",status="2xx"}' in body
+    assert 'http_requests_total{method="GET",route="/api/library/books/{book_id}",status="4xx"}' in body
+    assert 'http_requests_total{method="GET",route="unmatched",status="4xx"}' in body
+    assert "/api/library/books/999999" not in body
+    assert 'background_task_duration_seconds_count{task="metrics_test_task",outcome="error"} 1' in body
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -70,9 +70,10 @@ if __name__ == "__main__":
     if db_success and app_success:
         print("🎉 All tests passed! Your setup is ready to go!")
         print("\n📝 Next steps:")
-        print("1. Run: python create_sample_data.py")
-        print("2. Run: uvicorn main:app --reload")
-        print("3. Visit: http://localhost:8000/docs")
+        print("1. Run: alembic upgrade head")
+        print("2. Run: python create_sample_data.py")
+        print("3. Run: uvicorn main:app --reload")
+        print("4. Visit: http://localhost:8000/docs")
     else:
         print("❌ Some tests failed. Please check the errors above.")
         sys.exit(1)
@@ -0,0 +1,123 @@
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+from fastapi import HTTPException, status
+from config import settings
+
+class MemoryThrottleBackend:
+    """Per-process sliding-window counters, LRU-evicted beyond maxsize keys.
+
+    Each key keeps at most `limit` timestamps: an attempt is allowed when
+    fewer than `limit` of them fall inside the window.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        """Record an attempt; return 0 if allowed, else seconds until retry."""
+        # Async only to share the Redis backend's interface; it never awaits
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._windows.get(key)
+            if attempts is None or attempts.maxlen != limit:
+                attempts = self._windows[key] = deque(attempts or (), maxlen=limit)
+            self._windows.move_to_end(key)
+            if len(attempts) == limit and attempts[0] > now - window:
+                return attempts[0] + window - now
+            attempts.append(now)
+            while len(self._windows) > self.maxsize:
+                self._windows.popitem(last=False)
+                self.evictions += 1
+            return 0.0
+
+    async def reset(self, key: str):
+        with self._lock:
+            self._windows.pop(key, None)
+
+    def __len__(self):
+        return len(self._windows)
+
+# Trim, count and record in one atomic step; returns seconds until retry
+_SLIDING_WINDOW_SCRIPT = """
+local now, window, limit = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+if redis.call('ZCARD', KEYS[1]) >= limit then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return tostring(tonumber(oldest[2]) + window - now)
+end
+redis.call('ZADD', KEYS[1], now, ARGV[4])
+redis.call('EXPIRE', KEYS[1], math.ceil(window))
+return '0'
+"""
+
+class RedisThrottleBackend:
+    """Sliding windows in Redis sorted sets, shared by every worker.
+
+    Uses the asyncio client, since the login handler runs on the event loop.
+    """
+
+    def __init__(self, url: str, prefix: str = "throttle:"):
+        try:
+            from redis import asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("LOGIN_THROTTLE_REDIS_URL is set but the redis package is not installed") from exc
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(_SLIDING_WINDOW_SCRIPT)
+        self.prefix = prefix
+
+    async def hit(self, key: str, limit: int, window: float) -> float:
+        retry_after = await self._script(
+            keys=[self.prefix + key], args=[time.time(), window, limit, uuid.uuid4().hex]
+        )
+        return max(float(retry_after), 0.0)
+
+    async def reset(self, key: str):
+        await self._redis.delete(self.prefix + key)
+
+class LoginThrottle:
+    """Limits login attempts per username and per client IP."""
+
+    def __init__(self, backend, username_limit: int, ip_limit: int, window: float):
+        self.backend = backend
+        self.username_limit = username_limit
+        self.ip_limit = ip_limit
+        self.window = window
+        self.rejected = 0
+
+    async def check(self, username: str, client_ip: Optional[str]):
+        """Count an attempt, raising 429 with Retry-After once a limit is hit."""
+        retry_after = 0.0
+        if client_ip:
+            retry_after = await self.backend.hit(f"ip:{client_ip}", self.ip_limit, self.window)
+        if not retry_after:
+            retry_after = await self.backend.hit(f"user:{username.lower()}", self.username_limit, self.window)
+        if retry_after:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many login attempts, please retry later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    async def succeeded(self, username: str):
+        """Clear the username window after a successful login."""
+        await self.backend.reset(f"user:{username.lower()}")
+
+def _make_backend():
+    if settings.LOGIN_THROTTLE_REDIS_URL:
+        return RedisThrottleBackend(settings.LOGIN_THROTTLE_REDIS_URL)
+    return MemoryThrottleBackend(settings.LOGIN_THROTTLE_MAX_KEYS)
+
+login_throttle = LoginThrottle(
+    _make_backend(),
+    username_limit=settings.LOGIN_THROTTLE_MAX_PER_USERNAME,
+    ip_limit=settings.LOGIN_THROTTLE_MAX_PER_IP,
+    window=settings.LOGIN_THROTTLE_WINDOW_SECONDS
+)